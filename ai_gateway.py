@@ -0,0 +1,174 @@
+import itertools
+import json
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from protocol import MessageType, encode_message
+from chatbot.answer_cache import AnswerCache
+from chatbot.backends import BackendError, get_backend
+from chatbot.evaluate_answer import evaluate_answers
+from chatbot.question_cache import QuestionCache
+from chatbot.telemetry import telemetry
+
+
+class AIGateway:
+
+    def __init__(self, backends, max_concurrency=8, cache_size=1024, cache_ttl=3600, question_variety=3, answer_threshold=0.9, answer_questions=256):
+        self.backends = backends
+        self.limit = threading.BoundedSemaphore(max(1, max_concurrency))
+        self.executor = ThreadPoolExecutor(max_workers=max(1, max_concurrency) * 2)
+        self.cache_size = cache_size
+        self.cache_ttl = cache_ttl
+        self.cache = OrderedDict()
+        self.questions = QuestionCache(max_topics=cache_size, ttl=cache_ttl, variety=question_variety)
+        self.generate_question = self.questions.cached(lambda prompt: self.call_provider('question', prompt))
+        self.answers = AnswerCache(threshold=answer_threshold, max_questions=answer_questions) if answer_questions else None
+        self.in_flight = {}
+        self.lock = threading.Lock()
+
+
+    def submit(self, feature, prompt, callback, schema=None):
+        if feature not in self.backends:
+            callback(None, f'Unsupported AI feature: {feature}')
+            return
+
+        telemetry.increment('gateway_requests')
+        key = (feature, prompt, json.dumps(schema, sort_keys=True) if schema else None)
+
+        with self.lock:
+            if feature != 'question':
+                entry = self.cache.get(key)
+                if entry and time.monotonic() - entry[1] < self.cache_ttl:
+                    self.cache.move_to_end(key)
+                    telemetry.increment('gateway_cache_hits')
+                    callback(entry[0], None)
+                    return
+
+            waiters = self.in_flight.get(key)
+            if waiters is not None:
+                waiters.append(callback)
+                telemetry.increment('gateway_coalesced')
+                return
+            self.in_flight[key] = [callback]
+
+        self.executor.submit(self.run, key)
+
+
+    def run(self, key):
+        feature, prompt, schema = key
+        result, error = None, None
+
+        try:
+            if feature == 'question':
+                result = self.generate_question(prompt)
+            else:
+                result = self.call_provider(feature, prompt, json.loads(schema) if schema else None)
+        except Exception as e:
+            error = str(e) or type(e).__name__
+
+        with self.lock:
+            waiters = self.in_flight.pop(key, [])
+            if error is None and feature != 'question':
+                self.cache[key] = (result, time.monotonic())
+                self.cache.move_to_end(key)
+                while len(self.cache) > self.cache_size:
+                    self.cache.popitem(last=False)
+
+        for callback in waiters:
+            try:
+                callback(result, error)
+            except Exception as e:
+                print(f'[ERROR] AI gateway callback failed: {e}')
+
+
+    def evaluate(self, pairs, callback):
+        if 'evaluate' not in self.backends:
+            callback(None, 'Unsupported AI feature: evaluate')
+            return
+
+        telemetry.increment('gateway_evaluations')
+        self.executor.submit(self.run_evaluation, pairs, callback)
+
+
+    def run_evaluation(self, pairs, callback):
+        try:
+            results, error = evaluate_answers(pairs, self, self.answers), None
+        except Exception as e:
+            results, error = None, str(e) or type(e).__name__
+
+        try:
+            callback(results, error)
+        except Exception as e:
+            print(f'[ERROR] AI gateway callback failed: {e}')
+
+
+    def complete(self, prompt, feature='other', schema=None):
+        return self.call_provider(feature, prompt, schema)
+
+
+    def call_provider(self, feature, prompt, schema=None):
+        with self.limit:
+            telemetry.increment('gateway_provider_calls')
+            return get_backend(self.backends[feature]).complete(prompt, feature, schema)
+
+
+class GatewayBackend:
+
+    def __init__(self, client, timeout=30):
+        self.client = client
+        self.timeout = timeout
+        self.counter = itertools.count(1)
+        self.pending = {}
+        self.lock = threading.Lock()
+
+
+    def complete(self, prompt, feature='other', schema=None):
+        request_id = next(self.counter)
+        future = Future()
+
+        with self.lock:
+            self.pending[request_id] = future
+
+        message = {
+            'type': MessageType.AI_REQUEST.value,
+            'request_id': request_id,
+            'feature': feature,
+            'prompt': prompt
+        }
+        if schema:
+            message['schema'] = schema
+
+        try:
+            self.client.send_frame(encode_message(message))
+            return future.result(self.timeout)
+        finally:
+            with self.lock:
+                self.pending.pop(request_id, None)
+
+
+    def stream(self, prompt, feature='other'):
+        yield self.complete(prompt, feature)
+
+
+    def handle_response(self, msg_dict):
+        with self.lock:
+            future = self.pending.get(msg_dict.get('request_id'))
+
+        if future is None or future.done():
+            return
+
+        if msg_dict.get('error'):
+            future.set_exception(BackendError(msg_dict['error']))
+        else:
+            future.set_result(msg_dict.get('text', ''))
+
+
+    def fail_all(self, reason):
+        with self.lock:
+            pending, self.pending = self.pending, {}
+
+        for future in pending.values():
+            if not future.done():
+                future.set_exception(BackendError(reason))
@@ -0,0 +1,88 @@
+import heapq
+import itertools
+import threading
+import time
+
+from config import AI_MAX_WORKERS
+from chatbot.telemetry import telemetry
+
+
+PRIORITY_DUEL = 0
+PRIORITY_QUESTION = 1
+PRIORITY_FOLLOW_UP = 2
+PRIORITY_PREFETCH = 3
+
+
+class AIJob:
+
+    def __init__(self, worker, priority, key):
+        self.worker = worker
+        self.priority = priority
+        self.key = key
+        self.cancelled = False
+        self.submitted = time.monotonic()
+
+
+    def cancel(self):
+        self.cancelled = True
+        cancel = getattr(self.worker, 'cancel', None)
+        if cancel:
+            cancel()
+
+
+class AIWorkerPool:
+
+    def __init__(self, max_workers=2):
+        self.max_workers = max(1, max_workers)
+        self.queue = []
+        self.counter = itertools.count()
+        self.condition = threading.Condition()
+        self.latest = {}
+        self.threads = []
+
+
+    def submit(self, worker, priority=PRIORITY_FOLLOW_UP, key=None):
+        job = AIJob(worker, priority, key)
+
+        with self.condition:
+            if key is not None:
+                previous = self.latest.get(key)
+                if previous:
+                    previous.cancel()
+                self.latest[key] = job
+
+            heapq.heappush(self.queue, (priority, next(self.counter), job))
+
+            if len(self.threads) < self.max_workers:
+                thread = threading.Thread(target=self.run, daemon=True)
+                self.threads.append(thread)
+                thread.start()
+
+            self.condition.notify()
+
+        return job
+
+
+    def run(self):
+        while True:
+            with self.condition:
+                while not self.queue:
+                    self.condition.wait()
+                _, _, job = heapq.heappop(self.queue)
+
+            if job.cancelled:
+                continue
+
+            telemetry.record_queue_wait(getattr(job.worker, 'feature', 'other'), time.monotonic() - job.submitted)
+
+            try:
+                job.worker.run()
+            except Exception as e:
+                print(f'[ERROR] AI worker failed: {e}')
+            finally:
+                with self.condition:
+                    if job.key is not None and self.latest.get(job.key) is job:
+                        del self.latest[job.key]
+
+
+ai_pool = AIWorkerPool(AI_MAX_WORKERS)
@@ -0,0 +1,61 @@
+import argparse
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.common import percentile
+from chatbot.backends import BACKENDS, get_backend
+from chatbot.evaluate_answer import evaluation_prompt
+from chatbot.follow_up import follow_up_prompt
+from chatbot.question_gen import question_prompt
+
+
+PROMPTS = {
+    'question': lambda i: question_prompt(f'topic {i}'),
+    'evaluate': lambda i: evaluation_prompt(f'What is {i} + {i}?', str(i * 2)),
+    'follow_up': lambda i: follow_up_prompt([[f'How do I solve problem {i}?', 'own'], ['Start from the definition.', 'partner']])
+}
+
+
+def timed_call(backend, prompt, kind):
+    started = time.perf_counter()
+    first = None
+    try:
+        for _ in backend.stream(prompt, kind):
+            if first is None:
+                first = time.perf_counter() - started
+    except Exception:
+        return None, None
+    total = time.perf_counter() - started
+    return first if first is not None else total, total
+
+
+def bench(name, kind, requests, concurrency):
+    backend = get_backend(name)
+    prompts = [PROMPTS[kind](i) for i in range(requests)]
+
+    with ThreadPoolExecutor(concurrency) as executor:
+        results = list(executor.map(lambda prompt: timed_call(backend, prompt, kind), prompts))
+
+    first = [r[0] * 1000 for r in results if r[0] is not None]
+    total = [r[1] * 1000 for r in results if r[1] is not None]
+    errors = sum(1 for r in results if r[0] is None)
+    return first, total, errors
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare LLM backend latency side by side')
+    parser.add_argument('--backends', nargs='+', default=['fake'], choices=sorted(BACKENDS))
+    parser.add_argument('--kinds', nargs='+', default=list(PROMPTS), choices=list(PROMPTS))
+    parser.add_argument('--requests', type=int, default=20)
+    parser.add_argument('--concurrency', type=int, default=4)
+    args = parser.parse_args()
+
+    print(f'{"backend":>12} {"kind":>10} {"ttft_p50":>10} {"ttft_p95":>10} {"total_p50":>10} {"total_p95":>10} {"errors":>8}')
+    for name in args.backends:
+        for kind in args.kinds:
+            first, total, errors = bench(name, kind, args.requests, args.concurrency)
+            print(f'{name:>12} {kind:>10} {percentile(first, 50):>10.1f} {percentile(first, 95):>10.1f} {percentile(total, 50):>10.1f} {percentile(total, 95):>10.1f} {errors:>8}')
+
+
+if __name__ == '__main__':
+    main()
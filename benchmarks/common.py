@@ -0,0 +1,127 @@
+import asyncio
+import os
+import socket
+import subprocess
+import sys
+import time
+from collections import deque
+
+from protocol import FrameDecoder, encode_message, decode_message
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def free_port():
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def start_server(engine, port, extra_args=()):
+    process = subprocess.Popen(
+        [sys.executable, os.path.join(ROOT, 'server.py'), '--engine', engine, '--host', '127.0.0.1', '--port', str(port), *extra_args],
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+        cwd=ROOT
+    )
+
+    deadline = time.monotonic() + 10
+    while time.monotonic() < deadline:
+        try:
+            with socket.create_connection(('127.0.0.1', port), timeout=0.2):
+                return process
+        except OSError:
+            time.sleep(0.05)
+
+    process.kill()
+    raise RuntimeError(f'Server ({engine}) did not start on port {port}')
+
+
+def stop_server(process):
+    process.terminate()
+    try:
+        process.wait(timeout=5)
+    except subprocess.TimeoutExpired:
+        process.kill()
+
+
+def process_stats(pid):
+    stats = {'cpu': 0.0, 'threads': 0, 'rss': 0}
+    try:
+        with open(f'/proc/{pid}/stat') as f:
+            fields = f.read().rsplit(')', 1)[1].split()
+        ticks = os.sysconf('SC_CLK_TCK')
+        stats['cpu'] = (int(fields[11]) + int(fields[12])) / ticks
+
+        with open(f'/proc/{pid}/status') as f:
+            for line in f:
+                if line.startswith('Threads:'):
+                    stats['threads'] = int(line.split()[1])
+                elif line.startswith('VmRSS:'):
+                    stats['rss'] = int(line.split()[1]) * 1024
+    except (OSError, ValueError, IndexError):
+        pass
+    return stats
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+class BenchClient:
+
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+        self.decoder = FrameDecoder()
+        self.pending = deque()
+
+
+    @classmethod
+    async def connect(cls, host, port):
+        reader, writer = await asyncio.open_connection(host, port)
+        return cls(reader, writer)
+
+
+    async def send(self, message_dict, body=None):
+        self.writer.write(encode_message(message_dict, body))
+        await self.writer.drain()
+
+
+    async def receive(self):
+        while not self.pending:
+            data = await self.reader.read(65536)
+            if not data:
+                raise ConnectionError('Server closed the connection')
+
+            self.decoder.feed(data)
+            self.pending.extend(decode_message(frame) for frame in self.decoder.frames())
+
+        return self.pending.popleft()
+
+
+    async def receive_type(self, msg_type):
+        while True:
+            message_dict = await self.receive()
+            if message_dict.get('type') == msg_type:
+                return message_dict
+
+
+    async def wait_status(self, status_code):
+        while True:
+            message_dict = await self.receive_type('status')
+            if message_dict.get('status') == status_code:
+                return message_dict
+
+
+    async def close(self):
+        self.writer.close()
+        try:
+            await self.writer.wait_closed()
+        except OSError:
+            pass
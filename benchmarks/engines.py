@@ -0,0 +1,114 @@
+import argparse
+import asyncio
+import json
+import os
+import time
+
+from benchmarks.common import BenchClient, free_port, start_server, stop_server, process_stats, percentile
+
+
+MIN_CPU_SECONDS = 0.2
+
+
+async def open_pair(host, port, index):
+    subject = f'bench-{index}'
+
+    learner = await BenchClient.connect(host, port)
+    await learner.send({'type': 'register', 'subject': subject, 'role': 'learn'})
+    await learner.wait_status('waiting')
+
+    tutor = await BenchClient.connect(host, port)
+    await tutor.send({'type': 'register', 'subject': subject, 'role': 'tutor'})
+
+    await asyncio.gather(learner.wait_status('connected'), tutor.wait_status('connected'))
+    return learner, tutor
+
+
+async def ping_pong(learner, tutor, messages, latencies):
+    for _ in range(messages):
+        for sender, receiver in ((learner, tutor), (tutor, learner)):
+            await sender.send({'type': 'chat', 'content': json.dumps({'sent_at': time.perf_counter()})})
+            message_dict = await receiver.receive_type('chat')
+            sent_at = json.loads(message_dict['content'])['sent_at']
+            latencies.append(time.perf_counter() - sent_at)
+
+
+async def run_engine(engine, pairs, messages):
+    host = '127.0.0.1'
+    port = free_port()
+    process = start_server(engine, port)
+
+    try:
+        connect_started = time.perf_counter()
+        sessions = []
+        for start in range(0, pairs, 50):
+            batch = range(start, min(pairs, start + 50))
+            sessions.extend(await asyncio.gather(*(open_pair(host, port, i) for i in batch)))
+        connect_elapsed = time.perf_counter() - connect_started
+
+        idle = process_stats(process.pid)
+
+        latencies = []
+        relay_started = time.perf_counter()
+        await asyncio.gather(*(ping_pong(learner, tutor, messages, latencies) for learner, tutor in sessions))
+        relay_elapsed = time.perf_counter() - relay_started
+
+        busy = process_stats(process.pid)
+
+        for learner, tutor in sessions:
+            await learner.close()
+            await tutor.close()
+    finally:
+        stop_server(process)
+
+    cpu = busy['cpu'] - idle['cpu']
+    measured = cpu >= MIN_CPU_SECONDS
+
+    return {
+        'engine': engine,
+        'connections': pairs * 2,
+        'connect_s': connect_elapsed,
+        'messages': len(latencies),
+        'throughput': len(latencies) / relay_elapsed,
+        'p50_ms': percentile(latencies, 50) * 1000,
+        'p99_ms': percentile(latencies, 99) * 1000,
+        'cpu_s': cpu,
+        'msgs_per_cpu_s': len(latencies) / cpu if measured else None,
+        'conns_per_core': pairs * 2 * relay_elapsed / cpu if measured else None,
+        'threads': busy['threads'],
+        'rss_mb': busy['rss'] / 1048576
+    }
+
+
+def print_results(results):
+    columns = ['engine', 'connections', 'connect_s', 'messages', 'throughput', 'p50_ms', 'p99_ms', 'cpu_s', 'msgs_per_cpu_s', 'conns_per_core', 'threads', 'rss_mb']
+    print(' '.join(f'{c:>14}' for c in columns))
+    for result in results:
+        cells = []
+        for c in columns:
+            value = result[c]
+            if value is None:
+                cells.append(f'{"n/a":>14}')
+            else:
+                cells.append(f'{value:>14.2f}' if isinstance(value, float) else f'{value:>14}')
+        print(' '.join(cells))
+
+    if any(result['msgs_per_cpu_s'] is None for result in results):
+        print(f'n/a: the server used less than {MIN_CPU_SECONDS}s of CPU, too little to measure; raise --pairs or --messages')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare the threaded and asyncio server engines')
+    parser.add_argument('--engines', nargs='+', default=['threaded', 'asyncio'])
+    parser.add_argument('--pairs', type=int, default=500)
+    parser.add_argument('--messages', type=int, default=20)
+    args = parser.parse_args()
+
+    print(f'{os.cpu_count()} CPU(s), {args.pairs} pairs, {args.messages} round trips per pair')
+
+    results = [asyncio.run(run_engine(engine, args.pairs, args.messages)) for engine in args.engines]
+    print_results(results)
+
+
+if __name__ == '__main__':
+    main()
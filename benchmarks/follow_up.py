@@ -0,0 +1,102 @@
+import argparse
+import random
+import time
+
+from benchmarks.common import percentile
+from chatbot.backends import BACKENDS, get_backend
+from chatbot.follow_up import follow_up_prompt
+from chatbot.follow_up_model import FollowUpPredictor, context_of, token_overlap
+
+
+TOPICS = ['derivatives', 'integrals', 'limits', 'vectors', 'matrices', 'probability', 'recursion', 'loops', 'photosynthesis', 'mitosis', 'inflation', 'supply curves']
+EXPLANATIONS = [
+    'Let us look at {topic} in a bit more detail.',
+    'The key idea behind {topic} is easier with an example.',
+    'Here is how {topic} shows up in exam problems.'
+]
+QUESTIONS = [
+    'Can you give me an example of {topic}?',
+    'How are {topic} used in practice?',
+    'What is the most common mistake with {topic}?'
+]
+
+
+def make_sessions(count, turns, seed):
+    generator = random.Random(seed)
+    sessions = []
+    for _ in range(count):
+        history = []
+        for _ in range(turns):
+            topic = generator.choice(TOPICS)
+            history.append([generator.choice(EXPLANATIONS).format(topic=topic), 'partner'])
+            history.append([generator.choice(QUESTIONS).format(topic=topic), 'own'])
+        sessions.append(history)
+    return sessions
+
+
+def replay(predictor, sessions, learn):
+    latencies = []
+    suggestions = exact = near = 0
+
+    for history in sessions:
+        for i, (text, sender) in enumerate(history):
+            if sender != 'own' or i == 0:
+                continue
+
+            context = context_of(history[:i])
+            started = time.perf_counter()
+            suggestion, _ = predictor.predict(context)
+            latencies.append((time.perf_counter() - started) * 1e6)
+
+            if suggestion:
+                suggestions += 1
+                exact += suggestion == text
+                near += token_overlap(suggestion, text) >= 0.5
+
+            if learn:
+                predictor.learn(context, text)
+
+    return latencies, suggestions, exact, near
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Local follow-up predictor latency and acceptance rate')
+    parser.add_argument('--sessions', type=int, default=500)
+    parser.add_argument('--turns', type=int, default=10)
+    parser.add_argument('--train-fraction', type=float, default=0.8)
+    parser.add_argument('--remote', choices=sorted(BACKENDS), default='fake')
+    parser.add_argument('--remote-samples', type=int, default=10)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    sessions = make_sessions(args.sessions, args.turns, args.seed)
+    split = int(len(sessions) * args.train_fraction)
+    predictor = FollowUpPredictor(persist=False, max_pairs=args.sessions * args.turns)
+
+    started = time.perf_counter()
+    replay(predictor, sessions[:split], True)
+    trained = predictor.pairs
+    learn_us = (time.perf_counter() - started) / max(1, trained) * 1e6
+
+    latencies, suggestions, exact, near = replay(predictor, sessions[split:], False)
+
+    remote = []
+    backend = get_backend(args.remote)
+    for history in sessions[split:split + args.remote_samples]:
+        started = time.perf_counter()
+        try:
+            backend.complete(follow_up_prompt(history[:1]), 'follow_up')
+        except Exception as e:
+            print(f'Remote call failed: {e}')
+            continue
+        remote.append((time.perf_counter() - started) * 1e6)
+
+    print(f'Trained on {trained} pairs ({learn_us:.1f} us per pair)')
+    print(f'Local suggestion latency: p50 {percentile(latencies, 50):.1f} us, p99 {percentile(latencies, 99):.1f} us over {len(latencies)} predictions')
+    print(f'Remote ({args.remote}) latency: p50 {percentile(remote, 50) / 1000:.1f} ms, p99 {percentile(remote, 99) / 1000:.1f} ms over {len(remote)} calls')
+    if suggestions:
+        print(f'Acceptance: exact {exact / suggestions:.1%}, near (>= 0.5 token overlap) {near / suggestions:.1%} of {suggestions} suggestions')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,296 @@
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import time
+
+from benchmarks.common import BenchClient, free_port, start_server, stop_server, process_stats, percentile
+from file_transfer import FILE_CHUNK_SIZE, FILE_WINDOW_SIZE, FILE_ACK_INTERVAL
+from protocol import MessageType
+
+
+class Recorder:
+
+    def __init__(self):
+        self.latencies = {}
+        self.match_latencies = []
+        self.transfers = []
+        self.messages = 0
+        self.bytes = 0
+        self.errors = 0
+
+
+    def record(self, kind, sent_at, nbytes=0):
+        self.latencies.setdefault(kind, []).append(time.perf_counter() - sent_at)
+        self.messages += 1
+        self.bytes += nbytes
+
+
+async def register(host, port, subject, role):
+    client = await BenchClient.connect(host, port)
+    client.registered_at = time.perf_counter()
+    await client.send({'type': MessageType.REGISTER.value, 'subject': subject, 'role': role})
+    return client
+
+
+async def wait_connected(client, recorder):
+    await client.wait_status('connected')
+    recorder.match_latencies.append(time.perf_counter() - client.registered_at)
+
+
+async def relay(sender, receiver, msg_type, field, count, recorder):
+    async def send():
+        for _ in range(count):
+            await sender.send({'type': msg_type, field: json.dumps({'sent_at': time.perf_counter()})})
+
+    async def receive():
+        for _ in range(count):
+            message_dict = await receiver.receive_type(msg_type)
+            payload = message_dict.get(field, '')
+            recorder.record(msg_type, json.loads(payload)['sent_at'], len(payload))
+
+    await asyncio.gather(send(), receive())
+
+
+async def duel(challenger, opponent, recorder):
+    sent_at = time.perf_counter()
+    await challenger.send({'type': MessageType.DUEL_REQUEST.value, 'question': 'load question'})
+    request, _ = await asyncio.gather(opponent.receive_type(MessageType.DUEL_REQUEST.value), challenger.receive_type(MessageType.DUEL_REQUEST.value))
+    recorder.record(MessageType.DUEL_REQUEST.value, sent_at)
+
+    sent_at = time.perf_counter()
+    await opponent.send({'type': MessageType.DUEL_ANSWER.value, 'duel_id': request['duel_id'], 'answer': 'load answer'})
+    await challenger.send({'type': MessageType.DUEL_ANSWER.value, 'duel_id': request['duel_id'], 'answer': 'load answer'})
+    await challenger.receive_type(MessageType.DUEL_ANSWER.value)
+    recorder.record(MessageType.DUEL_ANSWER.value, sent_at)
+
+    sent_at = time.perf_counter()
+    await challenger.send({
+        'type': MessageType.DUEL_RESULT.value,
+        'duel_id': request['duel_id'],
+        'own': {'score': random.randint(0, 10), 'feedback': ''},
+        'partner': {'score': random.randint(0, 10), 'feedback': ''}
+    })
+    await asyncio.gather(opponent.receive_type(MessageType.DUEL_RESULT.value), challenger.receive_type(MessageType.DUEL_RESULT.value))
+    recorder.record(MessageType.DUEL_RESULT.value, sent_at)
+
+
+async def transfer_file(sender, receiver, size, recorder):
+    transfer_id = os.urandom(8).hex()
+    chunk = os.urandom(min(FILE_CHUNK_SIZE, max(size, 1)))
+    started = time.perf_counter()
+
+    async def send():
+        await sender.send({'type': MessageType.FILE_OFFER.value, 'transfer_id': transfer_id, 'filename': 'load.bin', 'size': size})
+        await sender.receive_type(MessageType.FILE_ACCEPT.value)
+
+        sent = 0
+        acked = 0
+        while sent < size:
+            while sent - acked >= FILE_WINDOW_SIZE:
+                acked = (await sender.receive_type(MessageType.FILE_ACK.value))['offset']
+
+            length = min(len(chunk), size - sent)
+            await sender.send({'type': MessageType.FILE_CHUNK.value, 'transfer_id': transfer_id, 'offset': sent}, chunk[:length])
+            sent += length
+
+        while acked < size:
+            acked = (await sender.receive_type(MessageType.FILE_ACK.value))['offset']
+
+    async def receive():
+        await receiver.receive_type(MessageType.FILE_OFFER.value)
+        await receiver.send({'type': MessageType.FILE_ACCEPT.value, 'transfer_id': transfer_id, 'offset': 0})
+
+        received = 0
+        acked = 0
+        while received < size:
+            message_dict = await receiver.receive_type(MessageType.FILE_CHUNK.value)
+            received += len(message_dict['data'])
+            if received - acked >= FILE_ACK_INTERVAL or received >= size:
+                acked = received
+                await receiver.send({'type': MessageType.FILE_ACK.value, 'transfer_id': transfer_id, 'offset': received})
+
+    await asyncio.gather(send(), receive())
+    recorder.transfers.append((size, time.perf_counter() - started))
+    recorder.bytes += size
+
+
+async def run_pair(host, port, index, args, recorder):
+    await asyncio.sleep(random.uniform(0, args.ramp))
+    subject = f'load-{index}'
+
+    learner = await register(host, port, subject, 'learn')
+    tutor = await register(host, port, subject, 'teach')
+
+    try:
+        await asyncio.wait_for(asyncio.gather(wait_connected(learner, recorder), wait_connected(tutor, recorder)), args.timeout)
+
+        for burst in range(args.bursts):
+            sender, receiver = (learner, tutor) if burst % 2 == 0 else (tutor, learner)
+            await relay(sender, receiver, MessageType.CHAT.value, 'content', args.burst_size, recorder)
+
+        await relay(tutor, learner, MessageType.QUESTION.value, 'content', args.questions, recorder)
+
+        for _ in range(args.duels):
+            await duel(learner, tutor, recorder)
+
+        for size in args.file_sizes:
+            await transfer_file(learner, tutor, size, recorder)
+    except (asyncio.TimeoutError, ConnectionError, OSError) as e:
+        recorder.errors += 1
+        print(f'Pair {index} failed: {e!r}', file=sys.stderr)
+    finally:
+        await learner.close()
+        await tutor.close()
+
+
+async def sample_server(pid, samples, stop):
+    while not stop.is_set():
+        samples.append(process_stats(pid))
+        try:
+            await asyncio.wait_for(stop.wait(), 0.25)
+        except asyncio.TimeoutError:
+            pass
+
+
+async def run_load(args):
+    process = None
+    host, port = args.host, args.port
+
+    if args.spawn:
+        host, port = '127.0.0.1', free_port()
+        process = start_server(args.spawn, port, args.server_args)
+
+    recorder = Recorder()
+    samples = []
+    stop = asyncio.Event()
+    sampler = asyncio.create_task(sample_server(process.pid, samples, stop)) if process else None
+
+    try:
+        started = time.perf_counter()
+        await asyncio.gather(*(run_pair(host, port, i, args, recorder) for i in range(args.pairs)))
+        elapsed = time.perf_counter() - started
+    finally:
+        stop.set()
+        if sampler:
+            await sampler
+        if process:
+            stop_server(process)
+
+    return summarize(args, recorder, elapsed, samples)
+
+
+def summarize(args, recorder, elapsed, samples):
+    summary = {
+        'engine': args.spawn or f'{args.host}:{args.port}',
+        'pairs': args.pairs,
+        'elapsed_s': elapsed,
+        'errors': recorder.errors,
+        'match_p50_ms': percentile(recorder.match_latencies, 50) * 1000,
+        'match_p99_ms': percentile(recorder.match_latencies, 99) * 1000,
+        'messages': recorder.messages,
+        'messages_per_s': recorder.messages / elapsed,
+        'mb_per_s': recorder.bytes / elapsed / 1048576,
+        'relay': {}
+    }
+
+    all_latencies = []
+    for kind, latencies in sorted(recorder.latencies.items()):
+        all_latencies.extend(latencies)
+        summary['relay'][kind] = {
+            'count': len(latencies),
+            'p50_ms': percentile(latencies, 50) * 1000,
+            'p99_ms': percentile(latencies, 99) * 1000
+        }
+
+    summary['relay_p50_ms'] = percentile(all_latencies, 50) * 1000
+    summary['relay_p99_ms'] = percentile(all_latencies, 99) * 1000
+
+    if recorder.transfers:
+        total_bytes = sum(size for size, _ in recorder.transfers)
+        total_time = sum(duration for _, duration in recorder.transfers)
+        summary['file_mb_per_s'] = total_bytes / total_time / 1048576 if total_time else 0.0
+
+    if samples:
+        summary['server_peak_rss_mb'] = max(s['rss'] for s in samples) / 1048576
+        summary['server_peak_threads'] = max(s['threads'] for s in samples)
+        summary['server_cpu_s'] = samples[-1]['cpu'] - samples[0]['cpu']
+
+    return summary
+
+
+def print_summary(summary):
+    print(f'Server: {summary["engine"]}, {summary["pairs"]} pairs, {summary["elapsed_s"]:.2f}s, {summary["errors"]} errors')
+    print(f'Match latency: p50 {summary["match_p50_ms"]:.2f} ms, p99 {summary["match_p99_ms"]:.2f} ms')
+    print(f'Throughput: {summary["messages_per_s"]:.0f} msg/s, {summary["mb_per_s"]:.2f} MB/s')
+    print(f'Relay latency: p50 {summary["relay_p50_ms"]:.2f} ms, p99 {summary["relay_p99_ms"]:.2f} ms')
+
+    for kind, stats in summary['relay'].items():
+        print(f'  {kind:>14}: {stats["count"]:>8} msgs, p50 {stats["p50_ms"]:.2f} ms, p99 {stats["p99_ms"]:.2f} ms')
+
+    if 'file_mb_per_s' in summary:
+        print(f'File transfer: {summary["file_mb_per_s"]:.2f} MB/s per transfer')
+    if 'server_peak_rss_mb' in summary:
+        print(f'Server: peak RSS {summary["server_peak_rss_mb"]:.1f} MB, peak threads {summary["server_peak_threads"]}, CPU {summary["server_cpu_s"]:.2f}s')
+
+
+def check_regressions(summary, baseline, tolerance):
+    regressions = []
+
+    for key in ('match_p99_ms', 'relay_p50_ms', 'relay_p99_ms', 'server_peak_rss_mb'):
+        if key in summary and baseline.get(key):
+            if summary[key] > baseline[key] * (1 + tolerance):
+                regressions.append(f'{key}: {baseline[key]:.2f} -> {summary[key]:.2f}')
+
+    for key in ('messages_per_s', 'file_mb_per_s'):
+        if key in summary and baseline.get(key):
+            if summary[key] < baseline[key] * (1 - tolerance):
+                regressions.append(f'{key}: {baseline[key]:.2f} -> {summary[key]:.2f}')
+
+    if summary['errors'] > baseline.get('errors', 0):
+        regressions.append(f'errors: {baseline.get("errors", 0)} -> {summary["errors"]}')
+
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Headless load generator for the TutorMe relay server')
+    parser.add_argument('--spawn', choices=['threaded', 'asyncio'], help='start a local server with this engine')
+    parser.add_argument('--server-args', nargs=argparse.REMAINDER, default=[], help='extra arguments for the spawned server')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=5555)
+    parser.add_argument('--pairs', type=int, default=200)
+    parser.add_argument('--ramp', type=float, default=1.0, help='seconds over which pairs connect')
+    parser.add_argument('--bursts', type=int, default=4)
+    parser.add_argument('--burst-size', type=int, default=10)
+    parser.add_argument('--questions', type=int, default=2)
+    parser.add_argument('--duels', type=int, default=1)
+    parser.add_argument('--file-sizes', type=int, nargs='*', default=[256 * 1024])
+    parser.add_argument('--timeout', type=float, default=30.0)
+    parser.add_argument('--json', help='write the summary as JSON to this path')
+    parser.add_argument('--baseline', help='fail if results regress against this JSON summary')
+    parser.add_argument('--tolerance', type=float, default=0.2)
+    args = parser.parse_args()
+
+    summary = asyncio.run(run_load(args))
+    print_summary(summary)
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(summary, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+
+        regressions = check_regressions(summary, baseline, args.tolerance)
+        for regression in regressions:
+            print(f'REGRESSION {regression}')
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,49 @@
+import argparse
+import random
+import time
+
+from matchmaking import Matchmaker, POLICIES
+
+
+def bench(policy, queued, subjects):
+    matchmaker = Matchmaker(policy)
+    learners = [object() for _ in range(queued)]
+
+    started = time.perf_counter()
+    for i, learner in enumerate(learners):
+        matchmaker.enqueue(learner, f'subject-{i % subjects}', 'learn')
+    enqueue_us = (time.perf_counter() - started) / queued * 1e6
+
+    cancelled = random.sample(learners, queued // 10)
+    started = time.perf_counter()
+    for learner in cancelled:
+        matchmaker.cancel(learner)
+    cancel_us = (time.perf_counter() - started) / len(cancelled) * 1e6
+
+    matches = queued // 2
+    started = time.perf_counter()
+    for i in range(matches):
+        tutor = object()
+        ticket = matchmaker.match(f'subject-{i % subjects}', 'teach')
+        if ticket:
+            matchmaker.record_match((tutor, 'teach'), (ticket.client, ticket.role))
+    match_us = (time.perf_counter() - started) / matches * 1e6
+
+    return enqueue_us, cancel_us, match_us
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Matchmaking queue cost with many queued learners')
+    parser.add_argument('--queued', type=int, nargs='+', default=[1000, 10000, 100000])
+    parser.add_argument('--subjects', type=int, default=8)
+    args = parser.parse_args()
+
+    print(f'{"policy":>14} {"queued":>10} {"enqueue_us":>12} {"cancel_us":>12} {"match_us":>12}')
+    for policy in POLICIES:
+        for queued in args.queued:
+            enqueue_us, cancel_us, match_us = bench(policy, queued, args.subjects)
+            print(f'{policy:>14} {queued:>10} {enqueue_us:>12.3f} {cancel_us:>12.3f} {match_us:>12.3f}')
+
+
+if __name__ == '__main__':
+    main()
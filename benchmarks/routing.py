@@ -0,0 +1,116 @@
+import argparse
+import base64
+import contextlib
+import io
+import json
+import os
+import time
+
+from protocol import MessageType, FrameDecoder, encode_message
+from server import ChatServer, Session
+
+
+class NullConnection:
+
+    def sendall(self, data, source=None):
+        return True
+
+
+    def send_control(self, data):
+        return True
+
+
+    def close(self):
+        pass
+
+
+def linear_find_partner(active_pairs, client_socket):
+    for pair in active_pairs:
+        if pair[0] == client_socket:
+            return pair[1]
+        elif pair[1] == client_socket:
+            return pair[0]
+    return None
+
+
+def build_server(pairs):
+    server = ChatServer()
+    server.server_socket.close()
+
+    connections = []
+    for i in range(pairs):
+        first, second = NullConnection(), NullConnection()
+        server.client_info[first] = {'subject': f'subject-{i}', 'role': 'learn'}
+        server.client_info[second] = {'subject': f'subject-{i}', 'role': 'tutor'}
+
+        session = Session(first, second, f'subject-{i}')
+        server.sessions[first] = session
+        server.sessions[second] = session
+        connections.append((first, second))
+
+    return server, connections
+
+
+def time_per_call(func, iterations):
+    started = time.perf_counter()
+    for _ in range(iterations):
+        func()
+    return (time.perf_counter() - started) / iterations * 1e6
+
+
+def bench(pairs, iterations):
+    server, connections = build_server(pairs)
+    active_pairs = list(connections)
+    sender = connections[-1][0]
+
+    decoder = FrameDecoder()
+    decoder.feed(encode_message({'type': MessageType.CHAT.value, 'content': 'hello'}))
+    frame = bytes(next(decoder.frames()))
+
+    index_us = time_per_call(lambda: server.find_partner(sender), iterations)
+    linear_iterations = max(1, min(iterations, 2000000 // max(pairs, 1)))
+    linear_us = time_per_call(lambda: linear_find_partner(active_pairs, sender), linear_iterations)
+    relay_us = time_per_call(lambda: server.handle_frame(sender, 'bench', frame), iterations)
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        started = time.perf_counter()
+        for first, _ in connections[:1000]:
+            server.disconnect_client(first)
+    teardown_us = (time.perf_counter() - started) / min(pairs, 1000) * 1e6
+
+    return index_us, linear_us, relay_us, teardown_us
+
+
+def bench_file_relay(size, iterations):
+    server, connections = build_server(1)
+    sender = connections[0][0]
+    content = os.urandom(size)
+
+    frame = encode_message({'type': MessageType.FILE_CHUNK.value, 'transfer_id': 'bench', 'offset': 0}, content)
+    header_us = time_per_call(lambda: server.handle_frame(sender, 'bench', memoryview(frame)), iterations)
+
+    legacy = json.dumps({'type': 'file_attachment', 'filename': 'lecture.pdf', 'data': base64.b64encode(content).decode('utf-8'), 'size': size}).encode('utf-8')
+    legacy_us = time_per_call(lambda: json.loads(legacy.decode('utf-8')), iterations)
+
+    return header_us, legacy_us
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Partner routing cost against the number of live pairs')
+    parser.add_argument('--pairs', type=int, nargs='+', default=[10, 100, 1000, 10000, 100000])
+    parser.add_argument('--iterations', type=int, default=100000)
+    parser.add_argument('--file-size', type=int, default=5 * 1024 * 1024)
+    args = parser.parse_args()
+
+    print(f'{"pairs":>10} {"index_us":>10} {"linear_us":>10} {"relay_us":>10} {"teardown_us":>12}')
+    for pairs in args.pairs:
+        index_us, linear_us, relay_us, teardown_us = bench(pairs, args.iterations)
+        print(f'{pairs:>10} {index_us:>10.3f} {linear_us:>10.3f} {relay_us:>10.3f} {teardown_us:>12.3f}')
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        header_us, legacy_us = bench_file_relay(args.file_size, 20)
+    print(f'\n{args.file_size} byte attachment: header-only relay {header_us:.1f} us, full JSON decode {legacy_us:.1f} us')
+
+
+if __name__ == '__main__':
+    main()
@@ -1,36 +1,169 @@
 from utils import get_resource_path
 from PySide6.QtWidgets import QWidget, QVBoxLayout, QHBoxLayout, QScrollArea, QLabel, QLineEdit, QPushButton, QFrame, QGraphicsOpacityEffect, QDialog, QTextEdit, QFileDialog
-from PySide6.QtCore import Qt, QPropertyAnimation, QEasingCurve, Signal, QObject
+from PySide6.QtCore import Qt, QPropertyAnimation, QEasingCurve, Signal, QObject, QTimer
 from PySide6.QtGui import QIcon
-import threading
-import base64
 import os
 
-from chatbot.follow_up import follow_up
-from chatbot.question_gen import generate_question
-from chatbot.evaluate_answer import evaluate_answer
+from config import FOLLOW_UP_IDLE_MS, FOLLOW_UP_MAX_WAIT_MS, FOLLOW_UP_LOCAL_CONFIDENCE
+from ai_pool import ai_pool, PRIORITY_QUESTION, PRIORITY_FOLLOW_UP
+from chatbot.follow_up import follow_up_stream, follow_up_context
+from chatbot.follow_up_model import FollowUpPredictor, context_of
+from chatbot.question_gen import generate_question_stream
+from chatbot.evaluate_answer import evaluate_answers
 
 
-class FollowUpWorker(QObject):
+STREAM_REPAINT_INTERVAL = 50
+FOLLOW_UP_PLACEHOLDER = 'Follow-ups will appear here'
+
+
+class AIWorker(QObject):
+
+    partial = Signal(str)
+
+
+    def __init__(self):
+        super().__init__()
+        self.cancelled = False
+
+
+    def cancel(self):
+        self.cancelled = True
+
+
+    def stream(self, chunks):
+        parts = []
+        for chunk in chunks:
+            if self.cancelled:
+                break
+            parts.append(chunk)
+            self.emit_partial(chunk)
+        return ''.join(parts)
+
+
+    def emit_partial(self, chunk):
+        self.partial.emit(chunk)
 
-    finished = Signal(str)
 
+class FollowUpWorker(AIWorker):
 
-    def __init__(self, messages):
+    feature = 'follow_up'
+    partial = Signal(int, str)
+    finished = Signal(int, str)
+
+
+    def __init__(self, messages, sequence=0, context=None):
         super().__init__()
         self.messages = messages
+        self.sequence = sequence
+        self.context = context
+
+
+    def emit_partial(self, chunk):
+        self.partial.emit(self.sequence, chunk)
 
 
     def run(self):
         try:
-            follow_up_text = follow_up(self.messages)
-            self.finished.emit(follow_up_text)
+            follow_up_text = self.stream(follow_up_stream(self.messages, self.context))
+            if not self.cancelled:
+                self.finished.emit(self.sequence, follow_up_text)
         except Exception as e:
-            self.finished.emit(f'Error: {str(e)}')
+            if not self.cancelled:
+                self.finished.emit(self.sequence, f'Error: {str(e)}')
+
+
+class FollowUpScheduler(QObject):
+
+    updated = Signal(str)
+
+
+    def __init__(self, messages, idle_ms=800, max_wait_ms=3000, parent=None):
+        super().__init__(parent)
+        self.messages = messages
+        self.context = follow_up_context()
+        self.sequence = 0
+        self.shown = 0
+        self.text = ''
+        self.dirty = False
+        self.in_flight = None
+        self.triggers = 0
+        self.calls = 0
+
+        self.idle_timer = QTimer(self)
+        self.idle_timer.setSingleShot(True)
+        self.idle_timer.setInterval(idle_ms)
+        self.idle_timer.timeout.connect(self.fire)
+
+        self.max_wait_timer = QTimer(self)
+        self.max_wait_timer.setSingleShot(True)
+        self.max_wait_timer.setInterval(max_wait_ms)
+        self.max_wait_timer.timeout.connect(self.fire)
 
 
-class QuestionGeneratorWorker(QObject):
+    def request(self):
+        self.triggers += 1
+        self.dirty = True
 
+        self.idle_timer.start()
+        if not self.max_wait_timer.isActive():
+            self.max_wait_timer.start()
+
+
+    def fire(self):
+        self.idle_timer.stop()
+        self.max_wait_timer.stop()
+
+        if not self.dirty or self.in_flight is not None:
+            return
+
+        self.dirty = False
+        self.sequence += 1
+        self.calls += 1
+        self.text = ''
+
+        worker = FollowUpWorker(self.messages.copy(), self.sequence, self.context)
+        worker.partial.connect(self._on_partial)
+        worker.finished.connect(self._on_finished)
+        self.in_flight = worker
+
+        ai_pool.submit(worker, PRIORITY_FOLLOW_UP, ('follow_up', id(self)))
+
+
+    def supersede(self):
+        self.dirty = False
+        self.idle_timer.stop()
+        self.max_wait_timer.stop()
+        self.sequence += 1
+        self.shown = self.sequence
+
+
+    def _on_partial(self, sequence, text):
+        if sequence != self.sequence or sequence < self.shown:
+            return
+
+        self.text += text
+        self.updated.emit(self.text)
+
+
+    def _on_finished(self, sequence, text):
+        if self.in_flight is not None and self.in_flight.sequence == sequence:
+            self.in_flight = None
+
+        if sequence >= self.shown:
+            self.shown = sequence
+            self.updated.emit(text)
+
+        if self.dirty and not self.idle_timer.isActive():
+            self.fire()
+
+
+    def stats(self):
+        return {'triggers': self.triggers, 'calls': self.calls}
+
+
+class QuestionGeneratorWorker(AIWorker):
+
+    feature = 'question'
     finished = Signal(str)
 
 
@@ -41,29 +174,38 @@ class QuestionGeneratorWorker(QObject):
 
     def run(self):
         try:
-            question = generate_question(self.topic)
-            self.finished.emit(question)
+            question = self.stream(generate_question_stream(self.topic))
+            if not self.cancelled:
+                self.finished.emit(question)
         except Exception as e:
-            self.finished.emit(f'Error: {str(e)}')
+            if not self.cancelled:
+                self.finished.emit(f'Error: {str(e)}')
 
 
-class AnswerEvaluatorWorker(QObject):
+class DuelEvaluatorWorker(AIWorker):
 
-    finished = Signal(dict)
+    feature = 'evaluate'
+    finished = Signal(list)
 
 
-    def __init__(self, question, answer):
+    def __init__(self, question, own_answer, partner_answer):
         super().__init__()
         self.question = question
-        self.answer = answer
+        self.own_answer = own_answer
+        self.partner_answer = partner_answer
 
 
     def run(self):
         try:
-            result = evaluate_answer(self.question, self.answer)
-            self.finished.emit(result)
+            answers = [self.own_answer, self.partner_answer]
+            scored = iter(evaluate_answers([(self.question, answer) for answer in answers if answer]))
+            results = [next(scored) if answer else None for answer in answers]
+            if not self.cancelled:
+                self.finished.emit(results)
         except Exception as e:
-            self.finished.emit({'score': 0, 'feedback': f'Error: {str(e)}'})
+            print(f'[ERROR] Duel evaluation failed: {e}')
+            if not self.cancelled:
+                self.finished.emit([])
 
 
 class ProblemDescriptionDialog(QDialog):
@@ -105,12 +247,13 @@ class DuelDialog(QDialog):
     answer_submitted = Signal(str)
 
 
-    def __init__(self, question, parent=None):
+    def __init__(self, question, deadline=None, parent=None):
         super().__init__(parent)
         self.setWindowTitle('Duel Challenge!')
         self.setModal(True)
         self.resize(500, 350)
         self.question = question
+        self.deadline = deadline
         self.my_score = None
         self.partner_score = None
 
@@ -148,7 +291,10 @@ class DuelDialog(QDialog):
         self.status_label = QLabel('')
         self.status_label.setObjectName('duelStatusLabel')
         self.status_label.setAlignment(Qt.AlignCenter)
-        self.status_label.hide()
+        if self.deadline:
+            self.status_label.setText(f'Answer within {self.deadline} seconds')
+        else:
+            self.status_label.hide()
         layout.addWidget(self.status_label)
 
         self.score_label = QLabel('')
@@ -188,6 +334,8 @@ class DuelDialog(QDialog):
 
     def display_score(self, score, feedback):
         self.my_score = score
+        self.answer_input.setEnabled(False)
+        self.submit_button.setEnabled(False)
         self.status_label.hide()
 
         score_text = f'Your Score: {score}/10\n{feedback}'
@@ -228,6 +376,14 @@ class DuelDialog(QDialog):
             self.close_button.setEnabled(True)
 
 
+    def end(self, text):
+        self.answer_input.setEnabled(False)
+        self.submit_button.setEnabled(False)
+        self.status_label.setText(text)
+        self.status_label.show()
+        self.close_button.setEnabled(True)
+
+
 class FileBubble(QFrame):
 
     download_clicked = Signal(dict)
@@ -292,6 +448,12 @@ class FileBubble(QFrame):
 
         layout.addLayout(file_info_layout)
 
+        # Transfer progress
+        self.progress_label = QLabel('Sending...' if self.is_own else 'Receiving...')
+        self.progress_label.setStyleSheet('font-size: 11px; background-color: transparent; color: #666666; font-style: italic;')
+        self.progress_label.setAlignment(Qt.AlignRight if self.is_own else Qt.AlignLeft)
+        layout.addWidget(self.progress_label)
+
         # Download button for received files
         if not self.is_own and self.file_data:
             self.download_button = QPushButton()
@@ -299,13 +461,8 @@ class FileBubble(QFrame):
             self.download_button.setIcon(QIcon(get_resource_path('assets/download.svg')))
             self.download_button.setCursor(Qt.PointingHandCursor)
             self.download_button.clicked.connect(lambda: self.download_clicked.emit(self.file_data))
+            self.download_button.setEnabled(bool(self.file_data.get('handle')))
             layout.addWidget(self.download_button)
-        elif self.is_own:
-            # Sent indicator for own files
-            sent_label = QLabel('Sent')
-            sent_label.setStyleSheet('font-size: 11px; background-color: transparent; color: #666666; font-style: italic;')
-            sent_label.setAlignment(Qt.AlignRight)
-            layout.addWidget(sent_label)
 
         if self.is_own:
             self.setObjectName('ownBubble')
@@ -315,6 +472,22 @@ class FileBubble(QFrame):
         self.setMinimumWidth(320)
         self.setMaximumWidth(500)
 
+    def set_progress(self, done, total):
+        if done >= total:
+            if self.is_own:
+                self.progress_label.setText('Sent')
+            return
+
+        percent = int(done * 100 / total) if total else 0
+        verb = 'Sending' if self.is_own else 'Receiving'
+        self.progress_label.setText(f'{verb}... {percent}%')
+
+
+    def set_complete(self, file_data):
+        self.file_data = file_data
+        self.progress_label.hide()
+        self.download_button.setEnabled(True)
+
     def animate_in(self):
         self.fade_anim = QPropertyAnimation(self.opacity_effect, b'opacity')
         self.fade_anim.setDuration(400)
@@ -327,9 +500,18 @@ class FileBubble(QFrame):
 
 class MessageBubble(QFrame):
 
+    text_changed = Signal()
+
+
     def __init__(self, text, bubble_type='own', parent=None):
         super().__init__(parent)
         self.bubble_type = bubble_type
+        self.text = text
+
+        self.repaint_timer = QTimer(self)
+        self.repaint_timer.setSingleShot(True)
+        self.repaint_timer.setInterval(STREAM_REPAINT_INTERVAL)
+        self.repaint_timer.timeout.connect(self.flush_text)
 
         self.setup_ui(text)
 
@@ -368,6 +550,23 @@ class MessageBubble(QFrame):
         self.setMaximumWidth(700)
 
 
+    def append_text(self, text):
+        self.text += text
+        if not self.repaint_timer.isActive():
+            self.repaint_timer.start()
+
+
+    def set_text(self, text):
+        self.text = text
+        self.repaint_timer.stop()
+        self.flush_text()
+
+
+    def flush_text(self):
+        self.label.setText(self.text)
+        self.text_changed.emit()
+
+
     def animate_in(self):
         self.fade_anim = QPropertyAnimation(self.opacity_effect, b'opacity')
         self.fade_anim.setDuration(400)
@@ -384,6 +583,7 @@ class ChatWidget(QWidget):
     duel_requested = Signal(str)
     duel_answer_submitted = Signal(str, str)
     file_attachment_selected = Signal(str)
+    file_saved = Signal(str, str)
 
 
     def __init__(self, parent=None):
@@ -392,11 +592,23 @@ class ChatWidget(QWidget):
         self.resize(600, 800)
 
         self.messages = []
+        self.file_bubbles = {}
+        self.file_spool = None
+        self.duel_topic = ''
+        self.follow_up_scheduler = FollowUpScheduler(self.messages, FOLLOW_UP_IDLE_MS, FOLLOW_UP_MAX_WAIT_MS, self)
+        self.follow_up_scheduler.updated.connect(self._on_follow_up_updated)
+        self.follow_up_predictor = FollowUpPredictor()
+        self.follow_up_suggestions = 0
+        self.follow_up_accepted = 0
+        self.stream_bubble = None
+        self.stream_container = None
         self.partner_connected = False
         self.active_duel_dialog = None
 
         self.setup_ui()
 
+        self.file_saved.connect(self._on_file_saved)
+
 
     def setup_ui(self):
         main_layout = QVBoxLayout(self)
@@ -459,7 +671,7 @@ class ChatWidget(QWidget):
         input_layout.addWidget(self.attach_button)
         input_layout.addWidget(self.send_button)
 
-        self.follow_up_button = QPushButton('Follow-ups will appear here')
+        self.follow_up_button = QPushButton(FOLLOW_UP_PLACEHOLDER)
         self.follow_up_button.setObjectName('followUpButton')
         self.follow_up_button.clicked.connect(lambda: self.message_input.setText(self.follow_up_button.text()))
 
@@ -517,6 +729,13 @@ class ChatWidget(QWidget):
         self.message_layout.insertWidget(self.message_layout.count() - 1, container)
         self.scroll_to_bottom()
 
+        if self.follow_up_button.text() != FOLLOW_UP_PLACEHOLDER:
+            self.follow_up_suggestions += 1
+            if text == self.follow_up_button.text():
+                self.follow_up_accepted += 1
+        if self.messages:
+            self.follow_up_predictor.learn(context_of(self.messages), text)
+
         self.messages.append([text, 'own'])
         self.generate_follow_up()
 
@@ -553,7 +772,20 @@ class ChatWidget(QWidget):
         self.scroll_to_bottom()
 
 
-    def send_ai_message(self, text):
+    def send_ai_message(self, text, from_stream=False):
+        if from_stream and self.stream_bubble:
+            self.stream_bubble.set_text(text)
+            self.stream_bubble = None
+            self.stream_container = None
+        else:
+            self.add_ai_bubble(text)
+            self.scroll_to_bottom()
+
+        self.messages.append([text, 'ai'])
+        self.generate_follow_up()
+
+
+    def add_ai_bubble(self, text):
         container = QWidget()
         layout = QHBoxLayout(container)
         layout.setContentsMargins(0, 0, 0, 0)
@@ -563,10 +795,21 @@ class ChatWidget(QWidget):
         layout.addStretch()
 
         self.message_layout.insertWidget(self.message_layout.count() - 1, container)
-        self.scroll_to_bottom()
+        return container, bubble
 
-        self.messages.append([text, 'ai'])
-        self.generate_follow_up()
+
+    def append_ai_stream(self, text):
+        if not self.stream_bubble:
+            self.stream_container, self.stream_bubble = self.add_ai_bubble('')
+            self.stream_bubble.text_changed.connect(self.scroll_to_bottom)
+        self.stream_bubble.append_text(text)
+
+
+    def discard_ai_stream(self):
+        if self.stream_container:
+            self.stream_container.deleteLater()
+        self.stream_bubble = None
+        self.stream_container = None
 
 
     def send_file_message(self, filename, is_own, file_data=None):
@@ -580,6 +823,8 @@ class ChatWidget(QWidget):
         file_bubble = FileBubble(filename, is_own, file_data)
         if not is_own:
             file_bubble.download_clicked.connect(self.on_file_download_clicked)
+        if file_data and file_data.get('transfer_id'):
+            self.file_bubbles[(is_own, file_data['transfer_id'])] = file_bubble
 
         layout.addWidget(file_bubble)
 
@@ -590,9 +835,24 @@ class ChatWidget(QWidget):
         self.scroll_to_bottom()
 
 
+    def update_file_progress(self, transfer_id, done, total):
+        for is_own in (True, False):
+            file_bubble = self.file_bubbles.get((is_own, transfer_id))
+            if file_bubble:
+                file_bubble.set_progress(done, total)
+                if is_own and done >= total:
+                    del self.file_bubbles[(is_own, transfer_id)]
+
+
+    def complete_file_transfer(self, transfer_id, file_data):
+        file_bubble = self.file_bubbles.pop((False, transfer_id), None)
+        if file_bubble:
+            file_bubble.set_complete(file_data)
+
+
     def on_file_download_clicked(self, file_data):
         filename = file_data.get('filename', 'download')
-        encoded_data = file_data.get('data', '')
+        handle = file_data.get('handle')
 
         save_path, _ = QFileDialog.getSaveFileName(
             self,
@@ -602,13 +862,14 @@ class ChatWidget(QWidget):
         )
 
         if save_path:
-            try:
-                file_bytes = base64.b64decode(encoded_data)
-                with open(save_path, 'wb') as f:
-                    f.write(file_bytes)
-                self.send_status(f'File saved: {os.path.basename(save_path)}')
-            except Exception as e:
-                self.send_status(f'Error saving file: {str(e)}')
+            self.file_spool.save_async(handle, save_path, self.file_saved.emit)
+
+
+    def _on_file_saved(self, save_path, error):
+        if error:
+            self.send_status(f'Error saving file: {error}')
+        else:
+            self.send_status(f'File saved: {os.path.basename(save_path)}')
 
 
     def on_send_clicked(self):
@@ -630,14 +891,17 @@ class ChatWidget(QWidget):
 
 
     def generate_follow_up(self):
-        worker = FollowUpWorker(self.messages.copy())
-        worker.finished.connect(self._on_follow_up_generated)
+        suggestion, confidence = self.follow_up_predictor.predict(context_of(self.messages))
+        if suggestion:
+            self.follow_up_button.setText(suggestion)
 
-        thread = threading.Thread(target=worker.run, daemon=True)
-        thread.start()
+        if not suggestion or confidence < FOLLOW_UP_LOCAL_CONFIDENCE:
+            self.follow_up_scheduler.request()
+        else:
+            self.follow_up_scheduler.supersede()
 
 
-    def _on_follow_up_generated(self, follow_up_text):
+    def _on_follow_up_updated(self, follow_up_text):
         self.follow_up_button.setText(follow_up_text)
 
 
@@ -659,20 +923,24 @@ class ChatWidget(QWidget):
                 self.send_status('Generating question...')
                 self.generate_question_button.setEnabled(False)
 
+                self.discard_ai_stream()
+
                 worker = QuestionGeneratorWorker(topic)
+                worker.partial.connect(self.append_ai_stream)
                 worker.finished.connect(self._on_question_generated)
 
-                thread = threading.Thread(target=worker.run, daemon=True)
-                thread.start()
+                ai_pool.submit(worker, PRIORITY_QUESTION)
 
 
     def _on_question_generated(self, question):
         self.generate_question_button.setEnabled(self.partner_connected)
 
         if question.startswith('Error:'):
+            self.discard_ai_stream()
             self.send_status(question)
         else:
             self.question_generated.emit(question)
+            self.discard_ai_stream()
 
 
     def set_partner_connected(self, connected):
@@ -688,6 +956,7 @@ class ChatWidget(QWidget):
 
         dialog = ProblemDescriptionDialog(self)
         dialog.setWindowTitle('Start a Duel')
+        dialog.text_edit.setPlainText(self.duel_topic)
         if dialog.exec() == QDialog.Accepted:
             topic = dialog.get_description()
             if topic:
@@ -697,8 +966,8 @@ class ChatWidget(QWidget):
                 self.duel_requested.emit(topic)
 
 
-    def show_duel_dialog(self, question):
-        self.active_duel_dialog = DuelDialog(question, self)
+    def show_duel_dialog(self, question, deadline=None):
+        self.active_duel_dialog = DuelDialog(question, deadline, self)
         self.active_duel_dialog.answer_submitted.connect(self.on_duel_answer_submitted)
         self.active_duel_dialog.exec()
         self.active_duel_dialog = None
@@ -715,6 +984,17 @@ class ChatWidget(QWidget):
             self.active_duel_dialog.display_score(score, feedback)
 
 
+    def set_duel_status(self, text):
+        if self.active_duel_dialog:
+            self.active_duel_dialog.status_label.setText(text)
+            self.active_duel_dialog.status_label.show()
+
+
+    def end_duel(self, text):
+        if self.active_duel_dialog:
+            self.active_duel_dialog.end(text)
+
+
     def display_partner_duel_score(self, partner_score):
         if self.active_duel_dialog:
             self.active_duel_dialog.set_partner_score(partner_score)
@@ -0,0 +1,133 @@
+import hashlib
+import random
+import re
+import threading
+from collections import OrderedDict
+
+from chatbot.telemetry import telemetry
+
+
+MERSENNE_PRIME = (1 << 61) - 1
+NUMBER_PATTERN = re.compile(r'-?\d+(?:[.,]\d+)?')
+SENTENCE_PUNCTUATION = re.compile(r'(?<!\d)[.,;:!?\'"]|[.,;:!?\'"](?!\d)')
+
+
+def normalize_answer(text):
+    return ' '.join(SENTENCE_PUNCTUATION.sub(' ', text.casefold()).split())
+
+
+def shingles(text, size=5):
+    if len(text) <= size:
+        return {text}
+    return {text[i:i + size] for i in range(len(text) - size + 1)}
+
+
+def jaccard(first, second):
+    if not first and not second:
+        return 1.0
+    return len(first & second) / len(first | second)
+
+
+class MinHasher:
+
+    def __init__(self, num_perm=64, seed=1):
+        generator = random.Random(seed)
+        self.permutations = [(generator.randrange(1, MERSENNE_PRIME), generator.randrange(0, MERSENNE_PRIME)) for _ in range(num_perm)]
+
+
+    def signature(self, shingle_set):
+        hashes = [int.from_bytes(hashlib.blake2b(shingle.encode('utf-8'), digest_size=8).digest(), 'big') for shingle in shingle_set]
+        return tuple(min((a * h + b) % MERSENNE_PRIME for h in hashes) for a, b in self.permutations)
+
+
+class AnswerEntry:
+
+    def __init__(self, text, shingle_set, numbers, result):
+        self.text = text
+        self.shingles = shingle_set
+        self.numbers = numbers
+        self.result = result
+
+
+class AnswerCache:
+
+    def __init__(self, threshold=0.9, num_perm=64, bands=16, max_questions=256, max_answers=512):
+        self.threshold = threshold
+        self.bands = bands
+        self.rows = max(1, num_perm // bands)
+        self.hasher = MinHasher(self.bands * self.rows)
+        self.max_questions = max_questions
+        self.max_answers = max_answers
+        self.questions = OrderedDict()
+        self.lock = threading.Lock()
+
+
+    def bands_of(self, signature):
+        return [(i, signature[i * self.rows:(i + 1) * self.rows]) for i in range(self.bands)]
+
+
+    def prepare(self, answer):
+        text = normalize_answer(answer)
+        shingle_set = shingles(text)
+        return text, shingle_set, tuple(sorted(NUMBER_PATTERN.findall(text))), self.hasher.signature(shingle_set)
+
+
+    def lookup(self, question, answer):
+        text, shingle_set, numbers, signature = self.prepare(answer)
+
+        with self.lock:
+            bucket = self.questions.get(normalize_answer(question))
+            match = None
+
+            if bucket is not None:
+                candidates = set()
+                for band in self.bands_of(signature):
+                    candidates.update(bucket['index'].get(band, ()))
+
+                best = self.threshold
+                for entry_id in candidates:
+                    entry = bucket['entries'][entry_id]
+                    if entry.numbers != numbers:
+                        continue
+                    similarity = 1.0 if entry.text == text else jaccard(entry.shingles, shingle_set)
+                    if similarity >= best:
+                        best = similarity
+                        match = entry
+
+            if match is None:
+                telemetry.increment('answer_cache_misses')
+                return None
+
+            telemetry.increment('answer_cache_hits')
+            return dict(match.result)
+
+
+    def store(self, question, answer, result):
+        if str(result.get('feedback', '')).startswith('Error:'):
+            return
+
+        text, shingle_set, numbers, signature = self.prepare(answer)
+        key = normalize_answer(question)
+
+        with self.lock:
+            bucket = self.questions.get(key)
+            if bucket is None:
+                bucket = self.questions[key] = {'entries': OrderedDict(), 'index': {}, 'next_id': 0}
+            self.questions.move_to_end(key)
+
+            entry_id = bucket['next_id']
+            bucket['next_id'] += 1
+            bucket['entries'][entry_id] = AnswerEntry(text, shingle_set, numbers, dict(result))
+            for band in self.bands_of(signature):
+                bucket['index'].setdefault(band, []).append(entry_id)
+
+            if len(bucket['entries']) > self.max_answers:
+                old_id, _ = bucket['entries'].popitem(last=False)
+                for band, ids in list(bucket['index'].items()):
+                    if old_id in ids:
+                        ids.remove(old_id)
+                        if not ids:
+                            del bucket['index'][band]
+
+            while len(self.questions) > self.max_questions:
+                self.questions.popitem(last=False)
@@ -0,0 +1,196 @@
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+
+from config import FAKE_LATENCY, FAKE_JITTER, FAKE_ERROR_RATE, FAKE_SEED, LLM_DEADLINE, LLM_RETRIES, LLM_BACKOFF_BASE, LLM_BACKOFF_MAX, LLM_HEDGE_DELAY
+from chatbot.resilience import ResilientBackend, RetryBudget
+from chatbot.transport import genai_client, http_session, timeout
+
+
+HF_API_URL = 'https://router.huggingface.co/v1/chat/completions'
+
+
+class BackendError(Exception):
+    pass
+
+
+class GeminiBackend:
+
+    def __init__(self, model='gemini-2.5-flash'):
+        self.model = model
+
+
+    def complete(self, prompt, feature='other', schema=None):
+        config = None
+        if schema:
+            from google.genai import types
+            config = types.GenerateContentConfig(response_mime_type='application/json', response_schema=schema)
+
+        response = genai_client().models.generate_content(
+            model=self.model,
+            contents=prompt,
+            config=config,
+        )
+        return response.text
+
+
+    def stream(self, prompt, feature='other'):
+        for chunk in genai_client().models.generate_content_stream(
+            model=self.model,
+            contents=prompt,
+        ):
+            if chunk.text:
+                yield chunk.text
+
+
+class HuggingFaceBackend:
+
+    def __init__(self, model='meta-llama/Llama-3.1-8B-Instruct:novita', api_url=HF_API_URL):
+        self.model = model
+        self.api_url = api_url
+
+
+    def headers(self):
+        from credentials import hf
+        return {'Authorization': f'Bearer {hf}'}
+
+
+    def payload(self, prompt, stream=False, schema=None):
+        payload = {
+            'messages': [
+                {
+                    'role': 'user',
+                    'content': prompt
+                }
+            ],
+            'model': self.model
+        }
+        if stream:
+            payload['stream'] = True
+        if schema:
+            payload['response_format'] = {
+                'type': 'json_schema',
+                'json_schema': {'name': 'response', 'schema': schema}
+            }
+        return payload
+
+
+    def complete(self, prompt, feature='other', schema=None):
+        response = http_session().post(self.api_url, headers=self.headers(), timeout=timeout(), json=self.payload(prompt, schema=schema))
+        return response.json()['choices'][0]['message']['content']
+
+
+    def stream(self, prompt, feature='other'):
+        with http_session().post(self.api_url, headers=self.headers(), timeout=timeout(), stream=True, json=self.payload(prompt, True)) as response:
+            response.raise_for_status()
+
+            for line in response.iter_lines(decode_unicode=True):
+                if not line or not line.startswith('data:'):
+                    continue
+
+                data = line[len('data:'):].strip()
+                if data == '[DONE]':
+                    break
+
+                choices = json.loads(data).get('choices') or [{}]
+                content = (choices[0].get('delta') or {}).get('content')
+                if content:
+                    yield content
+
+
+class FakeBackend:
+
+    def __init__(self, latency=0.3, jitter=0.2, error_rate=0.0, seed=0, chunk_words=3):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.chunk_words = max(1, chunk_words)
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+
+
+    def delay(self):
+        with self.lock:
+            delay = self.latency + self.random.uniform(0, self.jitter)
+            failed = self.random.random() < self.error_rate
+        return delay, failed
+
+
+    def respond(self, prompt, feature, schema=None):
+        digest = int(hashlib.sha1(prompt.encode('utf-8')).hexdigest(), 16)
+
+        if feature == 'evaluate' and re.search(r'^Answer \d+:$', prompt, re.MULTILINE):
+            count = len(re.findall(r'^Answer \d+:$', prompt, re.MULTILINE))
+            if schema:
+                return json.dumps([{'i': i, 's': (digest >> i) % 11, 'f': f'Offline evaluation #{digest % 1000}-{i}.'} for i in range(1, count + 1)], separators=(',', ':'))
+            return json.dumps([{'index': i, 'score': (digest >> i) % 11, 'feedback': f'Offline evaluation #{digest % 1000}-{i}.'} for i in range(1, count + 1)])
+
+        if feature == 'evaluate' and schema:
+            return json.dumps({'s': digest % 11, 'f': f'Offline evaluation #{digest % 1000}.'}, separators=(',', ':'))
+
+        if feature == 'evaluate':
+            return f'Score: {digest % 11}\nFeedback: Offline evaluation #{digest % 1000}.'
+
+        subject = prompt.strip().splitlines()[-1][:80] if prompt.strip() else 'nothing'
+        return f'Offline {feature} #{digest % 1000}: what follows from "{subject}"?'
+
+
+    def complete(self, prompt, feature='other', schema=None):
+        delay, failed = self.delay()
+        time.sleep(delay)
+        if failed:
+            raise BackendError('Fake backend error')
+        return self.respond(prompt, feature, schema)
+
+
+    def stream(self, prompt, feature='other'):
+        delay, failed = self.delay()
+        words = self.respond(prompt, feature).split(' ')
+        chunks = [' '.join(words[i:i + self.chunk_words]) + ' ' for i in range(0, len(words), self.chunk_words)]
+
+        time.sleep(delay / 2)
+        if failed:
+            raise BackendError('Fake backend error')
+
+        for chunk in chunks:
+            time.sleep(delay / 2 / len(chunks))
+            yield chunk
+
+
+def fake_backend():
+    return FakeBackend(FAKE_LATENCY, FAKE_JITTER, FAKE_ERROR_RATE, FAKE_SEED)
+
+
+BACKENDS = {
+    'gemini': GeminiBackend,
+    'huggingface': HuggingFaceBackend,
+    'fake': fake_backend
+}
+
+lock = threading.Lock()
+instances = {}
+budgets = {}
+
+
+def register_backend(name, factory):
+    with lock:
+        BACKENDS[name] = factory
+        for key in [key for key in instances if key[0] == name]:
+            del instances[key]
+
+
+def get_backend(name, hedge=False):
+    with lock:
+        backend = instances.get((name, hedge))
+        if backend is None:
+            factory = BACKENDS.get(name)
+            if factory is None:
+                raise BackendError(f'Unknown LLM backend: {name}')
+
+            budget = budgets.setdefault(name, RetryBudget())
+            backend = ResilientBackend(factory(), LLM_DEADLINE, LLM_RETRIES, LLM_BACKOFF_BASE, LLM_BACKOFF_MAX, hedge, LLM_HEDGE_DELAY, budget)
+            instances[(name, hedge)] = backend
+        return backend
@@ -0,0 +1,98 @@
+import threading
+from collections import deque
+
+from chatbot.telemetry import CHARS_PER_TOKEN
+
+
+SPEAKERS = {'own': 'User', 'partner': 'Partner', 'ai': 'AI'}
+
+
+def estimate_tokens(text):
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+def clip(text, max_tokens):
+    max_chars = max_tokens * CHARS_PER_TOKEN
+    if len(text) <= max_chars:
+        return text
+    return text[:max_chars].rsplit(' ', 1)[0] + '...'
+
+
+class ConversationContext:
+
+    def __init__(self, header, footer, budget_tokens=600, message_tokens=200, summary_tokens=120, summary_words=12):
+        self.header = header
+        self.footer = footer
+        self.budget_tokens = budget_tokens
+        self.message_tokens = message_tokens
+        self.summary_tokens = summary_tokens
+        self.summary_words = summary_words
+        self.lock = threading.Lock()
+        self.reset()
+
+
+    def reset(self):
+        self.synced = 0
+        self.last = None
+        self.window = deque()
+        self.window_tokens = 0
+        self.summary_items = deque()
+        self.summary_item_tokens = 0
+        self.summary = ''
+
+
+    def render(self, msg, sender):
+        speaker = SPEAKERS.get(sender)
+        if speaker is None:
+            return None
+        line = f'{speaker}: {clip(" ".join(msg.split()), self.message_tokens)}\n'
+        return line, estimate_tokens(line)
+
+
+    def summarize(self, msg, sender):
+        words = msg.split()
+        text = ' '.join(words[:self.summary_words]) + ('...' if len(words) > self.summary_words else '')
+        item = f'{SPEAKERS[sender]}: {text}'
+        return item, estimate_tokens(item)
+
+
+    def sync(self, history):
+        if len(history) < self.synced or (self.synced and tuple(history[self.synced - 1]) != self.last):
+            self.reset()
+
+        evicted = False
+        for msg, sender in history[self.synced:]:
+            segment = self.render(msg, sender)
+            if segment is None:
+                continue
+
+            self.window.append((segment, msg, sender))
+            self.window_tokens += segment[1]
+
+            while len(self.window) > 1 and self.window_tokens > self.budget_tokens - self.summary_tokens:
+                (line, tokens), old_msg, old_sender = self.window.popleft()
+                self.window_tokens -= tokens
+                self.summary_items.append(self.summarize(old_msg, old_sender))
+                self.summary_item_tokens += self.summary_items[-1][1]
+                evicted = True
+
+        while self.summary_items and self.summary_item_tokens > self.summary_tokens:
+            self.summary_item_tokens -= self.summary_items.popleft()[1]
+
+        if evicted:
+            self.summary = '; '.join(item for item, _ in self.summary_items)
+
+        self.synced = len(history)
+        self.last = tuple(history[-1]) if history else None
+
+
+    def prompt(self, history):
+        with self.lock:
+            self.sync(history)
+
+            parts = [self.header]
+            if self.summary:
+                parts.append(f'Earlier: {self.summary}\n')
+            parts.extend(line for (line, _), _, _ in self.window)
+            parts.append(self.footer)
+            return ''.join(parts)
@@ -1,12 +1,53 @@
-from google import genai
-from credentials import gemini
+import json
+import re
+from concurrent.futures import ThreadPoolExecutor
 
+from config import EVALUATION_BACKEND, EVALUATION_HEDGE, EVALUATION_STRUCTURED
+from chatbot.backends import get_backend
+from chatbot.telemetry import telemetry
 
-client = genai.Client(api_key=gemini)
 
+EVALUATION_SCHEMA = {
+    'type': 'object',
+    'properties': {
+        's': {'type': 'integer'},
+        'f': {'type': 'string'}
+    },
+    'required': ['s', 'f']
+}
 
-def evaluate_answer(question, answer):
-    prompt = f'''Evaluate the following answer to the given question.
+BATCH_EVALUATION_SCHEMA = {
+    'type': 'array',
+    'items': {
+        'type': 'object',
+        'properties': {
+            'i': {'type': 'integer'},
+            's': {'type': 'integer'},
+            'f': {'type': 'string'}
+        },
+        'required': ['i', 's', 'f']
+    }
+}
+
+class EvaluationFormatError(ValueError):
+    pass
+
+
+def structured_evaluation_prompt(question, answer):
+    return f'''Evaluate the answer to the question. Score it from 0 to 10 and give feedback in one short sentence.
+
+Question: {question}
+
+Answer: {answer}
+
+Respond with only compact JSON: {{"s": score, "f": "feedback"}}'''
+
+
+def evaluation_prompt(question, answer):
+    if EVALUATION_STRUCTURED:
+        return structured_evaluation_prompt(question, answer)
+
+    return f'''Evaluate the following answer to the given question.
 Provide a score out of 10 and brief feedback.
 
 Question: {question}
@@ -17,13 +58,34 @@ Please respond in the following format:
 Score: [number from 0-10]
 Feedback: [brief feedback on the answer]'''
 
-    response = client.models.generate_content(
-        model='gemini-2.5-flash',
-        contents=prompt,
-    )
 
-    response_text = response.text.strip()
-    lines = response_text.split('\n')
+def validate_evaluation(item):
+    if not isinstance(item, dict):
+        raise EvaluationFormatError('Evaluation is not a JSON object')
+
+    score = item.get('s')
+    feedback = item.get('f')
+    if isinstance(score, bool) or not isinstance(score, int) or not 0 <= score <= 10:
+        raise EvaluationFormatError(f'Evaluation score is not an integer from 0 to 10: {score!r}')
+    if not isinstance(feedback, str):
+        raise EvaluationFormatError('Evaluation feedback is not a string')
+
+    return {
+        'score': score,
+        'feedback': feedback.strip()
+    }
+
+
+def parse_structured_evaluation(response_text):
+    try:
+        item = json.loads(response_text)
+    except (TypeError, ValueError) as e:
+        raise EvaluationFormatError(f'Evaluation is not valid JSON: {e}')
+    return validate_evaluation(item)
+
+
+def parse_evaluation(response_text):
+    lines = response_text.strip().split('\n')
 
     score = 0
     feedback = ''
@@ -39,6 +101,9 @@ Feedback: [brief feedback on the answer]'''
         elif line.startswith('Feedback:'):
             feedback = line.replace('Feedback:', '').strip()
 
+    if not any(line.startswith('Score:') for line in lines):
+        telemetry.increment('evaluate_parse_failures')
+
     if not feedback:
         feedback = '\n'.join([l for l in lines if not l.startswith('Score:')]).strip()
 
@@ -46,3 +111,108 @@ Feedback: [brief feedback on the answer]'''
         'score': score,
         'feedback': feedback
     }
+
+
+def score_answer(question, answer, backend=None):
+    backend = backend or get_backend(EVALUATION_BACKEND, EVALUATION_HEDGE)
+    if not EVALUATION_STRUCTURED:
+        return parse_evaluation(backend.complete(evaluation_prompt(question, answer), 'evaluate'))
+
+    response = backend.complete(evaluation_prompt(question, answer), 'evaluate', EVALUATION_SCHEMA)
+    try:
+        return parse_structured_evaluation(response)
+    except EvaluationFormatError:
+        telemetry.increment('evaluate_parse_failures')
+        raise
+
+
+def evaluate_answer(question, answer):
+    return score_answer(question, answer)
+
+
+def batch_evaluation_prompt(pairs):
+    items = '\n\n'.join(f'Answer {i}:\nQuestion: {question}\nAnswer: {answer}' for i, (question, answer) in enumerate(pairs, 1))
+    if EVALUATION_STRUCTURED:
+        return f'''Evaluate each answer to its question using the same standard for all of them.
+Score each from 0 to 10 and give feedback in one short sentence.
+
+{items}
+
+Respond with only a compact JSON array with one object per answer, in order: [{{"i": answer number, "s": score, "f": "feedback"}}]'''
+
+    return f'''Evaluate each of the following answers to its question using the same standard for all of them.
+Give each a score out of 10 and brief feedback.
+
+{items}
+
+Respond with only a JSON array containing one object per answer, in order, like:
+[{{"index": 1, "score": [number from 0-10], "feedback": "[brief feedback on the answer]"}}]'''
+
+
+def parse_structured_batch_evaluation(response_text, count):
+    try:
+        items = json.loads(response_text)
+    except (TypeError, ValueError) as e:
+        raise EvaluationFormatError(f'Batch evaluation is not valid JSON: {e}')
+    if not isinstance(items, list) or len(items) != count:
+        raise EvaluationFormatError(f'Batch evaluation does not contain {count} answers')
+
+    results = [None] * count
+    for item in items:
+        index = item.get('i') if isinstance(item, dict) else None
+        if isinstance(index, bool) or not isinstance(index, int) or not 1 <= index <= count or results[index - 1] is not None:
+            raise EvaluationFormatError(f'Batch evaluation has an invalid answer number: {index!r}')
+        results[index - 1] = validate_evaluation(item)
+    return results
+
+
+def parse_batch_evaluation(response_text, count):
+    if EVALUATION_STRUCTURED:
+        return parse_structured_batch_evaluation(response_text, count)
+
+    match = re.search(r'\[.*\]', response_text, re.DOTALL)
+    if not match:
+        raise ValueError('Batch evaluation did not contain a JSON array')
+
+    items = json.loads(match.group(0))
+    results = [None] * count
+    for position, item in enumerate(items):
+        index = item.get('index', position + 1) - 1
+        if 0 <= index < count:
+            score = max(0, min(10, int(item.get('score', 0))))
+            results[index] = {'score': score, 'feedback': str(item.get('feedback', ''))}
+
+    if None in results:
+        raise ValueError('Batch evaluation is missing answers')
+    return results
+
+
+def evaluate_answers(pairs, backend=None, cache=None):
+    results = [None] * len(pairs)
+    if cache is not None:
+        for i, (question, answer) in enumerate(pairs):
+            results[i] = cache.lookup(question, answer)
+
+    missing = [i for i, result in enumerate(results) if result is None]
+    batch = [pairs[i] for i in missing]
+    if len(batch) == 1:
+        scored = [score_answer(*batch[0], backend)]
+    elif batch:
+        schema = BATCH_EVALUATION_SCHEMA if EVALUATION_STRUCTURED else None
+        response = (backend or get_backend(EVALUATION_BACKEND, EVALUATION_HEDGE)).complete(batch_evaluation_prompt(batch), 'evaluate', schema)
+        try:
+            scored = parse_batch_evaluation(response, len(batch))
+        except (ValueError, TypeError, AttributeError) as e:
+            telemetry.increment('evaluate_parse_failures')
+            print(f'[WARN] Could not parse batch evaluation ({e}), scoring answers separately')
+            with ThreadPoolExecutor(max_workers=len(batch)) as executor:
+                scored = list(executor.map(lambda pair: score_answer(*pair, backend), batch))
+    else:
+        scored = []
+
+    for i, result in zip(missing, scored):
+        results[i] = result
+        if cache is not None:
+            cache.store(*pairs[i], result)
+
+    return results
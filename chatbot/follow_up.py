@@ -1,41 +1,23 @@
-import requests
-from credentials import hf
+from config import FOLLOW_UP_BACKEND, FOLLOW_UP_CONTEXT_TOKENS, FOLLOW_UP_MESSAGE_TOKENS, FOLLOW_UP_SUMMARY_TOKENS
+from chatbot.backends import get_backend
+from chatbot.context import ConversationContext
 
 
-API_URL = 'https://router.huggingface.co/v1/chat/completions'
+PROMPT_HEADER = 'Strictly predict what the user will ASK next based on this conversation. Do not repeat or evaluate the question. Just give the answer. \n\nConversation History:\n'
+PROMPT_FOOTER = '\nUser\'s question:'
 
-headers = {
-    'Authorization': f'Bearer {hf}',
-}
 
+def follow_up_context():
+    return ConversationContext(PROMPT_HEADER, PROMPT_FOOTER, FOLLOW_UP_CONTEXT_TOKENS, FOLLOW_UP_MESSAGE_TOKENS, FOLLOW_UP_SUMMARY_TOKENS)
 
-def query(msg):
-    response = requests.post(API_URL, headers=headers, json={
-        'messages': [
-            {
-                'role': 'user',
-                'content': msg
-            }
-        ],
-        'model': 'meta-llama/Llama-3.1-8B-Instruct:novita'
-    })
-    return response.json()['choices'][0]['message']['content']
 
+def follow_up_prompt(history, context=None):
+    return (context or follow_up_context()).prompt(history)
 
-def follow_up(history):
-    if len(history) > 5:
-        history = history[-5:]
 
-    prompt = 'Strictly predict what the user will ASK next based on this conversation. Do not repeat or evaluate the question. Just give the answer. \n\nConversation History:\n'
+def follow_up(history, context=None):
+    return get_backend(FOLLOW_UP_BACKEND).complete(follow_up_prompt(history, context), 'follow_up')
 
-    for msg, sender in history:
-        if sender == 'own':
-            prompt += f'User: {msg}\n'
-        elif sender == 'partner':
-            prompt += f'Partner: {msg}\n'
-        elif sender == 'ai':
-            prompt += f'AI: {msg}\n'
 
-    prompt += '\nUser\'s question:'
-
-    return query(prompt)
+def follow_up_stream(history, context=None):
+    return get_backend(FOLLOW_UP_BACKEND).stream(follow_up_prompt(history, context), 'follow_up')
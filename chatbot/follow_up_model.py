@@ -0,0 +1,190 @@
+import json
+import math
+import os
+import re
+import tempfile
+import threading
+from collections import Counter, deque
+
+
+FOLLOW_UP_DIR = os.path.join(tempfile.gettempdir(), 'tutorme', 'follow_up')
+TOKEN_PATTERN = re.compile(r'\w+')
+
+
+def tokenize(text):
+    return TOKEN_PATTERN.findall(text.casefold())
+
+
+def context_of(history, size=2):
+    return ' '.join(msg for msg, _ in history[-size:])
+
+
+def token_overlap(first, second):
+    first, second = set(tokenize(first)), set(tokenize(second))
+    if not first or not second:
+        return 0.0
+    return len(first & second) / len(first | second)
+
+
+class FollowUpPredictor:
+
+    def __init__(self, directory=FOLLOW_UP_DIR, max_pairs=5000, persist=True):
+        self.directory = directory
+        self.max_pairs = max_pairs
+        self.persist = persist
+        self.subject = None
+        self.lock = threading.Lock()
+        self.reset()
+
+
+    def reset(self):
+        self.questions = []
+        self.question_ids = {}
+        self.totals = []
+        self.postings = {}
+        self.popular = Counter()
+        self.history = deque()
+        self.pairs = 0
+        self.logged = 0
+
+
+    def log_path(self, subject):
+        name = re.sub(r'[^\w-]+', '_', subject.casefold()).strip('_') or 'general'
+        return os.path.join(self.directory, f'{name}.jsonl')
+
+
+    def set_subject(self, subject):
+        with self.lock:
+            if subject == self.subject:
+                return
+            self.subject = subject
+            self.reset()
+
+            if not self.persist:
+                return
+
+            path = self.log_path(subject)
+            if not os.path.exists(path):
+                return
+
+            pairs = []
+            with open(path, encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        pairs.append(json.loads(line))
+                    except json.JSONDecodeError:
+                        continue
+
+            for pair in pairs[-self.max_pairs:]:
+                self.add(pair['context'], pair['question'])
+            self.logged = len(pairs)
+
+
+    def add(self, context, question):
+        tokens = Counter(tokenize(context))
+        if not tokens:
+            return
+
+        question_id = self.question_ids.get(question)
+        if question_id is None:
+            question_id = self.question_ids[question] = len(self.questions)
+            self.questions.append(question)
+            self.totals.append(0)
+
+        self.totals[question_id] += sum(tokens.values())
+        for token, count in tokens.items():
+            posting = self.postings.setdefault(token, {})
+            posting[question_id] = posting.get(question_id, 0) + count
+        self.popular[question] += 1
+        self.history.append((context, question))
+        self.pairs += 1
+
+
+    def evict_oldest(self):
+        context, question = self.history.popleft()
+        tokens = Counter(tokenize(context))
+        question_id = self.question_ids[question]
+
+        self.totals[question_id] -= sum(tokens.values())
+        for token, count in tokens.items():
+            posting = self.postings[token]
+            posting[question_id] -= count
+            if posting[question_id] <= 0:
+                del posting[question_id]
+            if not posting:
+                del self.postings[token]
+
+        self.popular[question] -= 1
+        if self.popular[question] <= 0:
+            del self.popular[question]
+            del self.question_ids[question]
+            self.questions[question_id] = None
+        self.pairs -= 1
+
+
+    def rebuild(self):
+        history = list(self.history)
+        logged = self.logged
+        self.reset()
+        for context, question in history:
+            self.add(context, question)
+        self.logged = logged
+
+
+    def learn(self, context, question):
+        if not context.strip() or not question.strip():
+            return
+
+        with self.lock:
+            self.add(context, question)
+            while self.pairs > self.max_pairs:
+                self.evict_oldest()
+            if len(self.questions) > 2 * self.max_pairs:
+                self.rebuild()
+
+            subject = self.subject
+            self.logged += 1
+            rotate = self.logged > 2 * self.max_pairs
+            if rotate:
+                history = list(self.history)
+                self.logged = len(history)
+
+        if self.persist and subject:
+            try:
+                os.makedirs(self.directory, exist_ok=True)
+                path = self.log_path(subject)
+                if rotate:
+                    tmp_path = f'{path}.tmp'
+                    with open(tmp_path, 'w', encoding='utf-8') as f:
+                        for context, question in history:
+                            f.write(json.dumps({'context': context, 'question': question}) + '\n')
+                    os.replace(tmp_path, path)
+                else:
+                    with open(path, 'a', encoding='utf-8') as f:
+                        f.write(json.dumps({'context': context, 'question': question}) + '\n')
+            except OSError as e:
+                print(f'[ERROR] Failed to log follow-up pair: {e}')
+
+
+    def predict(self, context):
+        with self.lock:
+            total = len(self.question_ids)
+            if not total:
+                return None, 0.0
+
+            scores = {}
+            for token, query_count in Counter(tokenize(context)).items():
+                posting = self.postings.get(token)
+                if not posting:
+                    continue
+
+                idf = math.log(1 + total / len(posting))
+                for question_id, count in posting.items():
+                    scores[question_id] = scores.get(question_id, 0.0) + idf * query_count * count / self.totals[question_id]
+
+            if not scores:
+                question, _ = self.popular.most_common(1)[0]
+                return question, 0.0
+
+            question_id = max(scores, key=scores.get)
+            return self.questions[question_id], scores[question_id] / sum(scores.values())
@@ -0,0 +1,175 @@
+import os
+import re
+import sqlite3
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+
+from ai_pool import ai_pool, PRIORITY_PREFETCH
+
+
+CACHE_PATH = os.path.join(tempfile.gettempdir(), 'tutorme', 'questions.sqlite3')
+
+
+def normalize_topic(topic):
+    return ' '.join(re.sub(r'[^\w\s]', ' ', topic.casefold()).split())
+
+
+class RefillJob:
+
+    feature = 'prefetch'
+
+
+    def __init__(self, cache, key, topic, generate):
+        self.cache = cache
+        self.key = key
+        self.topic = topic
+        self.generate = generate
+
+
+    def run(self):
+        try:
+            question = self.generate(self.topic)
+            if question:
+                self.cache.put(self.topic, question)
+        except Exception as e:
+            print(f'[ERROR] Question cache refill failed: {e}')
+        finally:
+            with self.cache.lock:
+                self.cache.refilling.discard(self.key)
+
+
+class QuestionCache:
+
+    def __init__(self, max_topics=256, ttl=7 * 24 * 3600, variety=3, path=None):
+        self.max_topics = max_topics
+        self.ttl = ttl
+        self.variety = max(1, variety)
+        self.entries = OrderedDict()
+        self.refilling = set()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+        self.db = None
+        if path:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            self.db = sqlite3.connect(path, check_same_thread=False)
+            self.db.execute('CREATE TABLE IF NOT EXISTS questions (topic TEXT, question TEXT, created_at REAL)')
+            self.db.execute('CREATE INDEX IF NOT EXISTS questions_topic ON questions (topic, created_at)')
+            self.db.execute('DELETE FROM questions WHERE created_at < ?', (time.time() - ttl,))
+            self.db.commit()
+
+
+    def get(self, topic):
+        key = normalize_topic(topic)
+
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                entry = self.load(key)
+
+            if entry is not None:
+                now = time.time()
+                entry['questions'] = [item for item in entry['questions'] if now - item[1] < self.ttl]
+
+            if not entry or not entry['questions']:
+                self.entries.pop(key, None)
+                self.misses += 1
+                return None
+
+            self.entries.move_to_end(key)
+            self.hits += 1
+
+            questions = entry['questions']
+            question = questions[entry['next'] % len(questions)][0]
+            entry['next'] += 1
+            return question
+
+
+    def questions(self, topic):
+        key = normalize_topic(topic)
+
+        with self.lock:
+            entry = self.entries.get(key) or self.load(key)
+            if not entry:
+                return []
+
+            now = time.time()
+            return [question for question, created_at in entry['questions'] if now - created_at < self.ttl]
+
+
+    def put(self, topic, question):
+        key = normalize_topic(topic)
+        now = time.time()
+
+        with self.lock:
+            entry = self.entries.get(key) or self.load(key) or {'questions': [], 'next': 0}
+            if any(question == item[0] for item in entry['questions']):
+                return
+
+            entry['questions'].append((question, now))
+            entry['questions'] = entry['questions'][-self.variety:]
+            self.entries[key] = entry
+            self.entries.move_to_end(key)
+
+            while len(self.entries) > self.max_topics:
+                self.entries.popitem(last=False)
+
+            if self.db:
+                self.db.execute('INSERT INTO questions VALUES (?, ?, ?)', (key, question, now))
+                self.db.execute(
+                    'DELETE FROM questions WHERE topic = ? AND rowid NOT IN (SELECT rowid FROM questions WHERE topic = ? ORDER BY created_at DESC LIMIT ?)',
+                    (key, key, self.variety)
+                )
+                self.db.commit()
+
+
+    def load(self, key):
+        if not self.db:
+            return None
+
+        rows = self.db.execute(
+            'SELECT question, created_at FROM questions WHERE topic = ? AND created_at >= ? ORDER BY created_at LIMIT ?',
+            (key, time.time() - self.ttl, self.variety)
+        ).fetchall()
+        if not rows:
+            return None
+
+        entry = {'questions': rows, 'next': 0}
+        self.entries[key] = entry
+        while len(self.entries) > self.max_topics:
+            self.entries.popitem(last=False)
+        return entry
+
+
+    def needs_variety(self, topic):
+        key = normalize_topic(topic)
+        with self.lock:
+            entry = self.entries.get(key)
+            return entry is not None and len(entry['questions']) < self.variety and key not in self.refilling
+
+
+    def refill(self, topic, generate):
+        key = normalize_topic(topic)
+        with self.lock:
+            if key in self.refilling:
+                return
+            self.refilling.add(key)
+
+        ai_pool.submit(RefillJob(self, key, topic, generate), PRIORITY_PREFETCH)
+
+
+    def cached(self, generate):
+        def generate_cached(topic):
+            question = self.get(topic)
+            if question is None:
+                question = generate(topic)
+                if question:
+                    self.put(topic, question)
+            elif self.needs_variety(topic):
+                self.refill(topic, generate)
+            return question
+
+        return generate_cached
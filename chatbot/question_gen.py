@@ -1,13 +1,40 @@
-from google import genai
-from credentials import gemini
+from config import QUESTION_BACKEND, QUESTION_CACHE_TOPICS, QUESTION_CACHE_TTL, QUESTION_CACHE_VARIETY, QUESTION_CACHE_PERSIST
+from chatbot.backends import get_backend
+from chatbot.question_cache import CACHE_PATH, QuestionCache
 
 
-client = genai.Client(api_key=gemini)
+question_cache = QuestionCache(
+    max_topics=QUESTION_CACHE_TOPICS,
+    ttl=QUESTION_CACHE_TTL,
+    variety=QUESTION_CACHE_VARIETY,
+    path=CACHE_PATH if QUESTION_CACHE_PERSIST and QUESTION_BACKEND != 'fake' else None
+)
 
 
-def generate_question(topic):
-    response = client.models.generate_content(
-        model='gemini-2.5-flash',
-        contents=f'Generate a question about the following topic: {topic}. You only have to give the question statement and nothing else. Question statement: ',
-    )
-    return response.text
+def question_prompt(topic):
+    return f'Generate a question about the following topic: {topic}. You only have to give the question statement and nothing else. Question statement: '
+
+
+def generate_question_uncached(topic):
+    return get_backend(QUESTION_BACKEND).complete(question_prompt(topic), 'question')
+
+
+generate_question = question_cache.cached(generate_question_uncached)
+
+
+def generate_question_stream(topic):
+    question = question_cache.get(topic)
+    if question is not None:
+        if question_cache.needs_variety(topic):
+            question_cache.refill(topic, generate_question_uncached)
+        yield question
+        return
+
+    parts = []
+    for chunk in get_backend(QUESTION_BACKEND).stream(question_prompt(topic), 'question'):
+        parts.append(chunk)
+        yield chunk
+
+    question = ''.join(parts)
+    if question:
+        question_cache.put(topic, question)
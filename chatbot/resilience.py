@@ -0,0 +1,210 @@
+import queue
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, FIRST_COMPLETED, wait
+
+from chatbot.telemetry import telemetry
+
+
+class DeadlineExceeded(Exception):
+    pass
+
+
+class RetryBudget:
+
+    def __init__(self, ratio=0.2, minimum=3):
+        self.ratio = ratio
+        self.minimum = minimum
+        self.tokens = minimum
+        self.lock = threading.Lock()
+
+
+    def deposit(self):
+        with self.lock:
+            self.tokens = min(self.tokens + self.ratio, self.minimum + 10)
+
+
+    def withdraw(self):
+        with self.lock:
+            if self.tokens < 1:
+                return False
+            self.tokens -= 1
+            return True
+
+
+def run_in_thread(fn, *args):
+    future = Future()
+
+    def run():
+        if not future.set_running_or_notify_cancel():
+            return
+        try:
+            future.set_result(fn(*args))
+        except BaseException as e:
+            future.set_exception(e)
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    return future
+
+
+class ResilientBackend:
+
+    def __init__(self, backend, deadline=20, retries=2, backoff_base=0.5, backoff_max=4, hedge=False, hedge_delay=2.0, budget=None):
+        self.backend = backend
+        self.deadline = deadline
+        self.retries = retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.hedge = hedge
+        self.hedge_delay = hedge_delay
+        self.budget = budget or RetryBudget()
+        self.latencies = deque(maxlen=200)
+        self.lock = threading.Lock()
+        self.hedged = 0
+        self.retried = 0
+
+
+    def backoff(self, attempt):
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+
+
+    def current_hedge_delay(self):
+        with self.lock:
+            if len(self.latencies) < 20:
+                return self.hedge_delay
+            ordered = sorted(self.latencies)
+        return max(0.05, ordered[int(len(ordered) * 0.95) - 1])
+
+
+    def record(self, started):
+        with self.lock:
+            self.latencies.append(time.monotonic() - started)
+
+
+    def attempt(self, prompt, remaining, feature, schema=None):
+        started = time.monotonic()
+        futures = [run_in_thread(self.backend.complete, prompt, feature, schema)]
+
+        if self.hedge:
+            delay = self.current_hedge_delay()
+            if delay < remaining:
+                done, _ = wait(futures, timeout=delay)
+                if not done:
+                    self.hedged += 1
+                    telemetry.record_hedge(feature)
+                    futures.append(run_in_thread(self.backend.complete, prompt, feature, schema))
+
+        error = None
+        end = started + remaining
+        pending = set(futures)
+        while pending:
+            done, pending = wait(pending, timeout=max(0, end - time.monotonic()), return_when=FIRST_COMPLETED)
+            if not done:
+                break
+            for future in done:
+                if future.exception() is None:
+                    self.record(started)
+                    return future.result()
+                error = future.exception()
+
+        raise error or DeadlineExceeded(f'LLM call exceeded {self.deadline}s deadline')
+
+
+    def complete(self, prompt, feature='other', schema=None):
+        started = time.monotonic()
+        try:
+            response = self.complete_with_retries(prompt, feature, schema)
+        except Exception as e:
+            telemetry.record_call(feature, time.monotonic() - started, prompt, None, e)
+            raise
+
+        telemetry.record_call(feature, time.monotonic() - started, prompt, response)
+        return response
+
+
+    def complete_with_retries(self, prompt, feature, schema=None):
+        end = time.monotonic() + self.deadline
+        self.budget.deposit()
+
+        attempt = 0
+        while True:
+            remaining = end - time.monotonic()
+            try:
+                return self.attempt(prompt, remaining, feature, schema)
+            except Exception as e:
+                wait_time = self.backoff(attempt)
+                if attempt >= self.retries or isinstance(e, DeadlineExceeded) or time.monotonic() + wait_time >= end or not self.budget.withdraw():
+                    raise
+                print(f'[WARN] LLM call failed ({e}), retrying in {wait_time:.2f}s')
+                self.retried += 1
+                telemetry.record_retry(feature)
+                attempt += 1
+                time.sleep(wait_time)
+
+
+    def stream(self, prompt, feature='other'):
+        started = time.monotonic()
+        first_token = None
+        parts = []
+        try:
+            for chunk in self.stream_with_retries(prompt, feature):
+                if first_token is None:
+                    first_token = time.monotonic() - started
+                parts.append(chunk)
+                yield chunk
+        except Exception as e:
+            telemetry.record_call(feature, time.monotonic() - started, prompt, ''.join(parts), e, first_token)
+            raise
+
+        telemetry.record_call(feature, time.monotonic() - started, prompt, ''.join(parts), None, first_token)
+
+
+    def stream_with_retries(self, prompt, feature):
+        end = time.monotonic() + self.deadline
+        self.budget.deposit()
+
+        attempt = 0
+        while True:
+            chunks = queue.Queue()
+
+            def produce():
+                try:
+                    for chunk in self.backend.stream(prompt, feature):
+                        chunks.put(('chunk', chunk))
+                    chunks.put(('done', None))
+                except Exception as e:
+                    chunks.put(('error', e))
+
+            thread = threading.Thread(target=produce, daemon=True)
+            thread.start()
+
+            received = False
+            while True:
+                remaining = end - time.monotonic()
+                try:
+                    kind, value = chunks.get(timeout=max(0, remaining))
+                except queue.Empty:
+                    if received:
+                        raise DeadlineExceeded(f'LLM stream stalled for more than {self.deadline}s between chunks')
+                    raise DeadlineExceeded(f'LLM stream sent no first chunk within {self.deadline}s')
+
+                if kind == 'chunk':
+                    received = True
+                    yield value
+                    end = time.monotonic() + self.deadline
+                elif kind == 'done':
+                    return
+                else:
+                    break
+
+            wait_time = self.backoff(attempt)
+            if received or attempt >= self.retries or time.monotonic() + wait_time >= end or not self.budget.withdraw():
+                raise value
+            print(f'[WARN] LLM stream failed ({value}), retrying in {wait_time:.2f}s')
+            self.retried += 1
+            telemetry.record_retry(feature)
+            attempt += 1
+            time.sleep(wait_time)
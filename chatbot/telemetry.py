@@ -0,0 +1,208 @@
+import bisect
+import json
+import os
+import tempfile
+import threading
+import time
+
+
+TELEMETRY_PATH = os.path.join(tempfile.gettempdir(), 'tutorme', 'telemetry.json')
+LATENCY_BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 20000, 60000)
+CHARS_PER_TOKEN = 4
+
+
+class Histogram:
+
+    def __init__(self, buckets=LATENCY_BUCKETS_MS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+
+    def add(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.total += value
+        self.max = max(self.max, value)
+
+
+    def percentile(self, pct):
+        if not self.count:
+            return 0.0
+
+        target = pct / 100 * self.count
+        seen = 0
+        for i, count in enumerate(self.counts):
+            seen += count
+            if seen >= target:
+                return min(self.buckets[i], self.max) if i < len(self.buckets) else self.max
+        return self.max
+
+
+    def snapshot(self):
+        return {
+            'count': self.count,
+            'mean': self.total / self.count if self.count else 0.0,
+            'p50': self.percentile(50),
+            'p95': self.percentile(95),
+            'p99': self.percentile(99),
+            'max': self.max,
+            'buckets': dict(zip([str(b) for b in self.buckets] + ['inf'], self.counts))
+        }
+
+
+class FeatureStats:
+
+    def __init__(self):
+        self.calls = 0
+        self.failures = 0
+        self.retries = 0
+        self.hedges = 0
+        self.prompt_chars = 0
+        self.response_chars = 0
+        self.latency = Histogram()
+        self.first_token = Histogram()
+        self.queue_wait = Histogram()
+        self.errors = {}
+
+
+    def snapshot(self):
+        return {
+            'calls': self.calls,
+            'failures': self.failures,
+            'error_rate': self.failures / self.calls if self.calls else 0.0,
+            'retries': self.retries,
+            'hedges': self.hedges,
+            'prompt_chars': self.prompt_chars,
+            'response_chars': self.response_chars,
+            'prompt_tokens_est': self.prompt_chars // CHARS_PER_TOKEN,
+            'response_tokens_est': self.response_chars // CHARS_PER_TOKEN,
+            'latency_ms': self.latency.snapshot(),
+            'first_token_ms': self.first_token.snapshot(),
+            'queue_wait_ms': self.queue_wait.snapshot(),
+            'errors': dict(self.errors)
+        }
+
+
+class Telemetry:
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.features = {}
+        self.counters = {}
+        self.timings = {}
+        self.started = time.time()
+        self.reporter = None
+
+
+    def stats(self, feature):
+        stats = self.features.get(feature)
+        if stats is None:
+            stats = self.features[feature] = FeatureStats()
+        return stats
+
+
+    def record_call(self, feature, seconds, prompt, response, error=None, first_token=None):
+        with self.lock:
+            stats = self.stats(feature)
+            stats.calls += 1
+            stats.latency.add(seconds * 1000)
+            stats.prompt_chars += len(prompt)
+            stats.response_chars += len(response or '')
+            if first_token is not None:
+                stats.first_token.add(first_token * 1000)
+            if error is not None:
+                stats.failures += 1
+                name = type(error).__name__
+                stats.errors[name] = stats.errors.get(name, 0) + 1
+
+
+    def record_retry(self, feature):
+        with self.lock:
+            self.stats(feature).retries += 1
+
+
+    def record_hedge(self, feature):
+        with self.lock:
+            self.stats(feature).hedges += 1
+
+
+    def increment(self, counter, amount=1):
+        with self.lock:
+            self.counters[counter] = self.counters.get(counter, 0) + amount
+
+
+    def record_queue_wait(self, feature, seconds):
+        with self.lock:
+            self.stats(feature).queue_wait.add(seconds * 1000)
+
+
+    def record_timing(self, name, seconds):
+        with self.lock:
+            histogram = self.timings.get(name)
+            if histogram is None:
+                histogram = self.timings[name] = Histogram()
+            histogram.add(seconds * 1000)
+
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                'started': self.started,
+                'uptime': time.time() - self.started,
+                'features': {feature: stats.snapshot() for feature, stats in self.features.items()},
+                'counters': dict(self.counters),
+                'timings': {name: histogram.snapshot() for name, histogram in self.timings.items()}
+            }
+
+
+    def summary(self):
+        snapshot = self.snapshot()
+        lines = [f'{"feature":>10} {"calls":>6} {"fail":>5} {"retry":>6} {"hedge":>6} {"p50_ms":>8} {"p95_ms":>8} {"wait_p95":>9} {"tok_in":>8} {"tok_out":>8}']
+        for feature, stats in sorted(snapshot['features'].items()):
+            lines.append(
+                f'{feature:>10} {stats["calls"]:>6} {stats["failures"]:>5} {stats["retries"]:>6} {stats["hedges"]:>6} '
+                f'{stats["latency_ms"]["p50"]:>8.0f} {stats["latency_ms"]["p95"]:>8.0f} {stats["queue_wait_ms"]["p95"]:>9.0f} '
+                f'{stats["prompt_tokens_est"]:>8} {stats["response_tokens_est"]:>8}'
+            )
+        for name, timing in sorted(snapshot['timings'].items()):
+            lines.append(f'{name}: n={timing["count"]} p50={timing["p50"]:.0f}ms p95={timing["p95"]:.0f}ms max={timing["max"]:.0f}ms')
+        if snapshot['counters']:
+            lines.append(' '.join(f'{name}={value}' for name, value in sorted(snapshot['counters'].items())))
+        hits = snapshot['counters'].get('answer_cache_hits', 0)
+        lookups = hits + snapshot['counters'].get('answer_cache_misses', 0)
+        if lookups:
+            lines.append(f'answer cache hit rate: {hits / lookups:.1%} of {lookups} lookups')
+        return '\n'.join(lines)
+
+
+    def dump(self, path=TELEMETRY_PATH):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        tmp_path = f'{path}.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(self.snapshot(), f, indent=2)
+        os.replace(tmp_path, path)
+        return path
+
+
+    def start_reporter(self, interval=60, path=TELEMETRY_PATH):
+        if self.reporter or interval <= 0:
+            return
+
+        def run():
+            while True:
+                time.sleep(interval)
+                if self.features or self.counters or self.timings:
+                    print(f'LLM telemetry:\n{self.summary()}')
+                    try:
+                        self.dump(path)
+                    except OSError as e:
+                        print(f'[ERROR] Failed to write telemetry: {e}')
+
+        self.reporter = threading.Thread(target=run, daemon=True)
+        self.reporter.start()
+
+
+telemetry = Telemetry()
@@ -0,0 +1,46 @@
+import threading
+
+from config import LLM_POOL_SIZE, LLM_CONNECT_TIMEOUT, LLM_READ_TIMEOUT
+
+
+lock = threading.Lock()
+session = None
+client = None
+
+
+def http_session():
+    global session
+
+    with lock:
+        if session is None:
+            import requests
+            from requests.adapters import HTTPAdapter
+
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=LLM_POOL_SIZE, pool_maxsize=LLM_POOL_SIZE)
+            session.mount('https://', adapter)
+            session.mount('http://', adapter)
+        return session
+
+
+def genai_client():
+    global client
+
+    with lock:
+        if client is None:
+            import httpx
+            from google import genai
+            from google.genai import types
+            from credentials import gemini
+
+            limits = httpx.Limits(max_connections=LLM_POOL_SIZE, max_keepalive_connections=LLM_POOL_SIZE)
+            http_options = types.HttpOptions(
+                timeout=int((LLM_CONNECT_TIMEOUT + LLM_READ_TIMEOUT) * 1000),
+                client_args={'limits': limits}
+            )
+            client = genai.Client(api_key=gemini, http_options=http_options)
+        return client
+
+
+def timeout():
+    return (LLM_CONNECT_TIMEOUT, LLM_READ_TIMEOUT)
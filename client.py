@@ -1,32 +1,27 @@
-from config import SERVER_HOST, SERVER_PORT
+from config import SERVER_HOST, SERVER_PORT, SPOOL_MAX_BYTES, TRANSFER_MAX_BYTES, TRANSFER_PART_TTL, QUESTION_POOL_SIZE, QUESTION_POOL_LOW_WATERMARK, TELEMETRY_INTERVAL
 
 import sys
 import socket
 import threading
 import json
-import base64
-import os
 from datetime import datetime
-from enum import Enum
 
 from PySide6.QtWidgets import QApplication, QMainWindow, QDialog, QVBoxLayout, QLabel, QComboBox, QDialogButtonBox
 from PySide6.QtCore import QObject, Signal, QTimer, Qt
 
-from chat_framework import ChatWidget, QuestionGeneratorWorker, AnswerEvaluatorWorker
+from chat_framework import ChatWidget, QuestionGeneratorWorker, DuelEvaluatorWorker, ai_pool
+from ai_pool import PRIORITY_DUEL
+from protocol import MessageType, FrameDecoder, FrameError, encode_message, decode_header, decode_message, frame_body
+from file_transfer import OutgoingTransfer, IncomingTransfer, prune_partial_files
+from spool import FileSpool, SpoolError
+from question_pool import QuestionPool
+from ai_gateway import GatewayBackend
+from chatbot.backends import register_backend
+from chatbot.question_gen import generate_question_uncached, question_cache
+from chatbot.telemetry import telemetry
 import style
 
 
-class MessageType(Enum):
-    CHAT = 'chat'
-    STATUS = 'status'
-    SYSTEM = 'system'
-    REGISTER = 'register'
-    QUESTION = 'question'
-    DUEL_REQUEST = 'duel_request'
-    DUEL_SCORE = 'duel_score'
-    FILE_ATTACHMENT = 'file_attachment'
-
-
 class SelectionDialog(QDialog):
 
     def __init__(self, parent=None):
@@ -100,9 +95,13 @@ class SocketChatClient(QObject):
     message_received = Signal(str)
     status_changed = Signal(str)
     question_received = Signal(str)
-    duel_request_received = Signal(str)
-    duel_score_received = Signal(int)
+    duel_request_received = Signal(dict)
+    duel_answer_received = Signal(dict)
+    duel_result_received = Signal(dict)
+    file_offered = Signal(dict)
+    file_progress = Signal(str, int, int)
     file_received = Signal(dict)
+    queue_position_changed = Signal(int)
 
 
     def __init__(self, host=SERVER_HOST, port=SERVER_PORT):
@@ -113,6 +112,12 @@ class SocketChatClient(QObject):
         self.connected = False
         self.running = False
         self.registered = False
+        self.send_lock = threading.Lock()
+        self.outgoing_transfers = {}
+        self.incoming_transfers = {}
+        self.spool = FileSpool(max_bytes=SPOOL_MAX_BYTES)
+        prune_partial_files(max_age=TRANSFER_PART_TTL)
+        self.gateway = GatewayBackend(self)
 
 
     def connect_to_server(self):
@@ -146,8 +151,7 @@ class SocketChatClient(QObject):
                 'subject': subject,
                 'role': role
             }
-            message_json = json.dumps(register_message)
-            self.client_socket.send(message_json.encode('utf-8'))
+            self.send_frame(encode_message(register_message))
             self.registered = True
             print(f'Registered with subject: {subject}, role: {role}')
             self.status_changed.emit(f'Looking for a {("tutor" if role == "learn" else "student")} in {subject}...')
@@ -158,45 +162,72 @@ class SocketChatClient(QObject):
             return False
 
 
+    def send_frame(self, data):
+        with self.send_lock:
+            self.client_socket.sendall(data)
+
+
     def receive_messages(self):
+        decoder = FrameDecoder()
+
         while self.running:
             try:
-                data = self.client_socket.recv(1048576 * 256)  # 256MB buffer for file attachments
-                if not data:
+                nbytes = self.client_socket.recv_into(decoder.get_buffer())
+                if not nbytes:
                     break
 
-                message_str = data.decode('utf-8')
-
-                try:
-                    msg_dict = json.loads(message_str)
-
-                    if 'type' not in msg_dict:
-                        print(f'[WARNING] Invalid message format: missing type field')
+                decoder.buffer_updated(nbytes)
+
+                for frame in decoder.frames():
+                    try:
+                        header = decode_header(frame)
+
+                        if header.get('type') == MessageType.FILE_CHUNK.value:
+                            self.handle_file_chunk(header, frame_body(frame))
+                            continue
+
+                        msg_dict = decode_message(frame)
+
+                        if 'type' not in msg_dict:
+                            print(f'[WARNING] Invalid message format: missing type field')
+                            continue
+
+                        msg_type = msg_dict.get('type')
+
+                        if msg_type == MessageType.STATUS.value:
+                            self.handle_status_message(msg_dict)
+                        elif msg_type == MessageType.CHAT.value:
+                            self.handle_chat_message(msg_dict)
+                        elif msg_type == MessageType.SYSTEM.value:
+                            self.handle_system_message(msg_dict)
+                        elif msg_type == MessageType.QUESTION.value:
+                            self.handle_question_message(msg_dict)
+                        elif msg_type == MessageType.DUEL_REQUEST.value:
+                            self.handle_duel_request(msg_dict)
+                        elif msg_type == MessageType.DUEL_ANSWER.value:
+                            self.handle_duel_answer(msg_dict)
+                        elif msg_type == MessageType.DUEL_RESULT.value:
+                            self.handle_duel_result(msg_dict)
+                        elif msg_type == MessageType.FILE_OFFER.value:
+                            self.handle_file_offer(msg_dict)
+                        elif msg_type == MessageType.FILE_ACCEPT.value:
+                            self.handle_file_accept(msg_dict)
+                        elif msg_type == MessageType.FILE_ACK.value:
+                            self.handle_file_ack(msg_dict)
+                        elif msg_type == MessageType.FILE_CANCEL.value:
+                            self.handle_file_cancel(msg_dict)
+                        elif msg_type == MessageType.AI_RESPONSE.value:
+                            self.gateway.handle_response(msg_dict)
+                        else:
+                            print(f'[WARNING] Unknown message type: {msg_type}')
+
+                    except json.JSONDecodeError as e:
+                        print(f'[ERROR] Invalid JSON received: {e}')
                         continue
 
-                    msg_type = msg_dict.get('type')
-
-                    if msg_type == MessageType.STATUS.value:
-                        self.handle_status_message(msg_dict)
-                    elif msg_type == MessageType.CHAT.value:
-                        self.handle_chat_message(msg_dict)
-                    elif msg_type == MessageType.SYSTEM.value:
-                        self.handle_system_message(msg_dict)
-                    elif msg_type == MessageType.QUESTION.value:
-                        self.handle_question_message(msg_dict)
-                    elif msg_type == MessageType.DUEL_REQUEST.value:
-                        self.handle_duel_request(msg_dict)
-                    elif msg_type == MessageType.DUEL_SCORE.value:
-                        self.handle_duel_score(msg_dict)
-                    elif msg_type == MessageType.FILE_ATTACHMENT.value:
-                        self.handle_file_attachment(msg_dict)
-                    else:
-                        print(f'[WARNING] Unknown message type: {msg_type}')
-
-                except json.JSONDecodeError as e:
-                    print(f'[ERROR] Invalid JSON received: {e}')
-                    continue
-
+            except FrameError as e:
+                print(f'\n[ERROR] Invalid frame received: {e}')
+                break
             except Exception as e:
                 if self.running:
                     print(f'\n[ERROR] Error receiving message: {e}')
@@ -210,6 +241,12 @@ class SocketChatClient(QObject):
         status_code = msg_dict.get('status', 'unknown')
         status_msg = msg_dict.get('message', 'Status update')
 
+        if 'position' in msg_dict:
+            self.queue_position_changed.emit(msg_dict['position'])
+
+        if status_code == 'queue':
+            return
+
         print(f'\n[STATUS] {status_msg}')
         self.status_changed.emit(status_msg)
 
@@ -219,6 +256,7 @@ class SocketChatClient(QObject):
             self.connected = True
         elif status_code == 'disconnected':
             self.connected = False
+            self.cancel_transfers()
 
 
     def handle_chat_message(self, msg_dict):
@@ -243,23 +281,152 @@ class SocketChatClient(QObject):
 
 
     def handle_duel_request(self, msg_dict):
-        question = msg_dict.get('question', '')
-        print(f'\n[DUEL REQUEST] {question}')
-        self.duel_request_received.emit(question)
+        print(f'\n[DUEL REQUEST] {msg_dict.get("question", "")}')
+        self.duel_request_received.emit(msg_dict)
+
+
+    def handle_duel_answer(self, msg_dict):
+        print(f'\n[DUEL ANSWERS] {msg_dict.get("own")} / {msg_dict.get("partner")}')
+        self.duel_answer_received.emit(msg_dict)
 
 
-    def handle_duel_score(self, msg_dict):
-        score = msg_dict.get('score', 0)
-        print(f'\n[PARTNER DUEL SCORE] {score}/10')
-        self.duel_score_received.emit(score)
+    def handle_duel_result(self, msg_dict):
+        if msg_dict.get('status') == 'finished':
+            print(f'\n[DUEL RESULT] {msg_dict.get("score", 0)}/10 vs {msg_dict.get("partner_score", 0)}/10')
+        else:
+            print(f'\n[DUEL RESULT] {msg_dict.get("status")}')
+        self.duel_result_received.emit(msg_dict)
 
 
-    def handle_file_attachment(self, msg_dict):
+    def handle_file_offer(self, msg_dict):
+        transfer_id = msg_dict.get('transfer_id', '')
         filename = msg_dict.get('filename', 'unknown')
-        file_data = msg_dict.get('data', '')
         file_size = msg_dict.get('size', 0)
-        print(f'\n[FILE RECEIVED] {filename} ({file_size} bytes)')
-        self.file_received.emit({'filename': filename, 'data': file_data, 'size': file_size})
+
+        previous = self.incoming_transfers.pop(transfer_id, None)
+        if previous:
+            previous.close()
+
+        pending = sum(transfer.size - transfer.received for transfer in self.incoming_transfers.values())
+
+        try:
+            transfer = IncomingTransfer(transfer_id, filename, file_size, max_bytes=TRANSFER_MAX_BYTES - pending)
+        except Exception as e:
+            print(f'[ERROR] Cannot receive file {filename}: {e}')
+            self.status_changed.emit(f'Declined file {filename}: {e}')
+            self.send_frame(encode_message({'type': MessageType.FILE_CANCEL.value, 'transfer_id': transfer_id}))
+            return
+
+        self.incoming_transfers[transfer_id] = transfer
+        print(f'\n[FILE OFFERED] {filename} ({file_size} bytes, resuming at {transfer.received})')
+
+        self.file_offered.emit({'filename': transfer.filename, 'size': file_size, 'transfer_id': transfer_id})
+        self.send_frame(encode_message({'type': MessageType.FILE_ACCEPT.value, 'transfer_id': transfer_id, 'offset': transfer.received}))
+
+        if transfer.complete:
+            self.finish_incoming_transfer(transfer)
+
+
+    def handle_file_chunk(self, header, body):
+        transfer = self.incoming_transfers.get(header.get('transfer_id'))
+        if not transfer:
+            return
+
+        try:
+            acknowledge = transfer.write(header.get('offset', -1), body)
+        except OSError as e:
+            print(f'[ERROR] Failed to write {transfer.filename}: {e}')
+            del self.incoming_transfers[transfer.transfer_id]
+            transfer.close(remove=True)
+            self.send_frame(encode_message({'type': MessageType.FILE_CANCEL.value, 'transfer_id': transfer.transfer_id}))
+            return
+
+        if acknowledge:
+            self.send_frame(encode_message(transfer.ack()))
+            self.file_progress.emit(transfer.transfer_id, transfer.received, transfer.size)
+
+        if transfer.complete:
+            self.finish_incoming_transfer(transfer)
+
+
+    def finish_incoming_transfer(self, transfer):
+        del self.incoming_transfers[transfer.transfer_id]
+        part_path = transfer.finish()
+
+        try:
+            handle = self.spool.add(transfer.transfer_id, part_path, transfer.filename)
+        except (SpoolError, OSError) as e:
+            print(f'[ERROR] Failed to store {transfer.filename}: {e}')
+            transfer.close(remove=True)
+            self.status_changed.emit(f'Failed to store file {transfer.filename}: {e}')
+            return
+
+        print(f'\n[FILE RECEIVED] {transfer.filename} ({transfer.size} bytes)')
+        self.file_received.emit({'filename': transfer.filename, 'size': transfer.size, 'transfer_id': transfer.transfer_id, 'handle': handle})
+
+
+    def handle_file_accept(self, msg_dict):
+        transfer = self.outgoing_transfers.get(msg_dict.get('transfer_id'))
+        if not transfer:
+            return
+
+        offset = max(0, min(msg_dict.get('offset', 0), transfer.size))
+        self.file_progress.emit(transfer.transfer_id, offset, transfer.size)
+
+        if offset >= transfer.size:
+            self.outgoing_transfers.pop(transfer.transfer_id, None)
+            print(f'[FILE SENT] {transfer.filename} ({transfer.size} bytes)')
+            return
+
+        sender_thread = threading.Thread(target=self.run_outgoing_transfer, args=(transfer, offset))
+        sender_thread.daemon = True
+        sender_thread.start()
+
+
+    def run_outgoing_transfer(self, transfer, offset):
+        try:
+            transfer.run(offset, self.send_frame)
+        except Exception as e:
+            if self.outgoing_transfers.get(transfer.transfer_id) is transfer:
+                del self.outgoing_transfers[transfer.transfer_id]
+            print(f'[ERROR] Failed to send file: {e}')
+            self.status_changed.emit(f'Failed to send file: {e}')
+
+
+    def handle_file_ack(self, msg_dict):
+        transfer = self.outgoing_transfers.get(msg_dict.get('transfer_id'))
+        if not transfer:
+            return
+
+        transfer.acknowledge(msg_dict.get('offset', 0))
+        self.file_progress.emit(transfer.transfer_id, transfer.acked, transfer.size)
+
+        if transfer.done:
+            self.outgoing_transfers.pop(transfer.transfer_id, None)
+            print(f'[FILE SENT] {transfer.filename} ({transfer.size} bytes)')
+
+
+    def handle_file_cancel(self, msg_dict):
+        transfer_id = msg_dict.get('transfer_id')
+
+        transfer = self.outgoing_transfers.pop(transfer_id, None)
+        if transfer:
+            transfer.cancel()
+            self.status_changed.emit(f'Partner declined file: {transfer.filename}')
+
+        transfer = self.incoming_transfers.pop(transfer_id, None)
+        if transfer:
+            transfer.close(remove=True)
+
+
+    def cancel_transfers(self):
+        for transfer in list(self.outgoing_transfers.values()):
+            transfer.cancel()
+        self.outgoing_transfers.clear()
+
+        for transfer in list(self.incoming_transfers.values()):
+            transfer.close()
+        self.incoming_transfers.clear()
 
 
     def send_message(self, message):
@@ -278,8 +445,7 @@ class SocketChatClient(QObject):
                     'type': MessageType.CHAT.value,
                     'content': message
                 }
-                message_json = json.dumps(chat_message)
-                self.client_socket.send(message_json.encode('utf-8'))
+                self.send_frame(encode_message(chat_message))
 
                 timestamp = datetime.now().strftime('%H:%M:%S')
                 print(f'[{timestamp}] You: {message}')
@@ -306,8 +472,7 @@ class SocketChatClient(QObject):
                     'type': MessageType.QUESTION.value,
                     'content': question
                 }
-                message_json = json.dumps(question_message)
-                self.client_socket.send(message_json.encode('utf-8'))
+                self.send_frame(encode_message(question_message))
                 print(f'[QUESTION SENT] {question}')
                 return True
             except Exception as e:
@@ -332,8 +497,7 @@ class SocketChatClient(QObject):
                     'type': MessageType.DUEL_REQUEST.value,
                     'question': question
                 }
-                message_json = json.dumps(duel_message)
-                self.client_socket.send(message_json.encode('utf-8'))
+                self.send_frame(encode_message(duel_message))
                 print(f'[DUEL REQUEST SENT] {question}')
                 return True
             except Exception as e:
@@ -343,65 +507,85 @@ class SocketChatClient(QObject):
         return False
 
 
-    def send_duel_score(self, score):
+    def send_duel_answer(self, duel_id, answer):
         if not self.registered:
-            print('[INFO] Cannot send duel score. Not registered yet.')
+            print('[INFO] Cannot send duel answer. Not registered yet.')
             return False
 
         if not self.connected:
-            print('[INFO] Cannot send duel score. Not connected to a partner yet.')
+            print('[INFO] Cannot send duel answer. Not connected to a partner yet.')
             return False
 
         try:
-            score_message = {
-                'type': MessageType.DUEL_SCORE.value,
-                'score': score
+            answer_message = {
+                'type': MessageType.DUEL_ANSWER.value,
+                'duel_id': duel_id,
+                'answer': answer
             }
-            message_json = json.dumps(score_message)
-            self.client_socket.send(message_json.encode('utf-8'))
-            print(f'[DUEL SCORE SENT] {score}/10')
+            self.send_frame(encode_message(answer_message))
+            print(f'[DUEL ANSWER SENT] {answer}')
             return True
         except Exception as e:
-            print(f'[ERROR] Failed to send duel score: {e}')
-            self.status_changed.emit(f'Failed to send duel score: {e}')
+            print(f'[ERROR] Failed to send duel answer: {e}')
+            self.status_changed.emit(f'Failed to send duel answer: {e}')
             return False
 
 
-    def send_file(self, file_path):
+    def send_duel_result(self, duel_id, own, partner):
         if not self.registered:
-            print('[INFO] Cannot send file. Not registered yet.')
+            print('[INFO] Cannot send duel result. Not registered yet.')
             return False
 
         if not self.connected:
-            print('[INFO] Cannot send file. Not connected to a partner yet.')
-            self.status_changed.emit('Cannot send file. Not connected to a partner yet.')
+            print('[INFO] Cannot send duel result. Not connected to a partner yet.')
             return False
 
         try:
-            # Check file size (limit to 5MB)
-            file_size = os.path.getsize(file_path)
-            if file_size > 5 * 1024 * 1024:
-                self.status_changed.emit('File too large. Maximum size is 5MB.')
-                return False
+            result_message = {
+                'type': MessageType.DUEL_RESULT.value,
+                'duel_id': duel_id,
+                'own': own,
+                'partner': partner
+            }
+            self.send_frame(encode_message(result_message))
+            print(f'[DUEL RESULT SENT] {own["score"] if own else "-"}/10 vs {partner["score"] if partner else "-"}/10')
+            return True
+        except Exception as e:
+            print(f'[ERROR] Failed to send duel result: {e}')
+            self.status_changed.emit(f'Failed to send duel result: {e}')
+            return False
 
-            # Read and encode file
-            with open(file_path, 'rb') as f:
-                file_data = f.read()
 
-            encoded_data = base64.b64encode(file_data).decode('utf-8')
-            filename = os.path.basename(file_path)
+    def send_duel_failure(self, duel_id):
+        try:
+            self.send_frame(encode_message({'type': MessageType.DUEL_RESULT.value, 'duel_id': duel_id, 'failed': True}))
+            print('[DUEL RESULT SENT] scoring failed')
+            return True
+        except Exception as e:
+            print(f'[ERROR] Failed to send duel result: {e}')
+            return False
 
-            file_message = {
-                'type': MessageType.FILE_ATTACHMENT.value,
-                'filename': filename,
-                'data': encoded_data,
-                'size': file_size
-            }
-            message_json = json.dumps(file_message)
-            self.client_socket.send(message_json.encode('utf-8'))
 
-            print(f'[FILE SENT] {filename} ({file_size} bytes)')
-            return True
+    def send_file(self, file_path):
+        if not self.registered:
+            print('[INFO] Cannot send file. Not registered yet.')
+            return False
+
+        if not self.connected:
+            print('[INFO] Cannot send file. Not connected to a partner yet.')
+            self.status_changed.emit('Cannot send file. Not connected to a partner yet.')
+            return False
+
+        try:
+            transfer = OutgoingTransfer(file_path)
+            previous = self.outgoing_transfers.pop(transfer.transfer_id, None)
+            if previous:
+                previous.cancel()
+            self.outgoing_transfers[transfer.transfer_id] = transfer
+            self.send_frame(encode_message(transfer.offer()))
+
+            print(f'[FILE OFFERED] {transfer.filename} ({transfer.size} bytes)')
+            return transfer
         except Exception as e:
             print(f'[ERROR] Failed to send file: {e}')
             self.status_changed.emit(f'Failed to send file: {e}')
@@ -412,10 +596,13 @@ class SocketChatClient(QObject):
         print('\n[STATUS] Disconnected from server')
         self.status_changed.emit('Disconnected from server')
         self.running = False
+        self.gateway.fail_all('Disconnected from server')
 
 
     def disconnect_server(self):
         self.running = False
+        self.cancel_transfers()
+        self.gateway.fail_all('Disconnected from server')
         if self.client_socket:
             try:
                 self.client_socket.close()
@@ -428,6 +615,7 @@ class TutorMeChatWidget(ChatWidget):
     def __init__(self, socket_client):
         super().__init__()
         self.socket_client = socket_client
+        self.file_spool = socket_client.spool
         self.setWindowTitle('TutorMe Chat')
 
 
@@ -447,6 +635,9 @@ class ChatWindow(QMainWindow):
         self.setGeometry(100, 100, 800, 600)
 
         self.socket_client = SocketChatClient()
+        self.duel = None
+        register_backend('gateway', lambda: self.socket_client.gateway)
+        self.question_pool = QuestionPool(generate_question_uncached, ai_pool, QUESTION_POOL_SIZE, QUESTION_POOL_LOW_WATERMARK, question_cache)
 
         self.chat_widget = TutorMeChatWidget(self.socket_client)
         self.setCentralWidget(self.chat_widget)
@@ -459,15 +650,19 @@ class ChatWindow(QMainWindow):
     def setup_connections(self):
         self.socket_client.message_received.connect(self.handle_socket_message)
         self.socket_client.status_changed.connect(self.handle_status_change)
+        self.socket_client.queue_position_changed.connect(self.handle_queue_position_changed)
         self.socket_client.question_received.connect(self.handle_question_received)
         self.chat_widget.question_generated.connect(self.handle_question_generated)
 
         self.chat_widget.duel_requested.connect(self.handle_duel_requested)
         self.chat_widget.duel_answer_submitted.connect(self.handle_duel_answer_submitted)
         self.socket_client.duel_request_received.connect(self.handle_duel_request_received)
-        self.socket_client.duel_score_received.connect(self.handle_duel_score_received)
+        self.socket_client.duel_answer_received.connect(self.handle_duel_answer_received)
+        self.socket_client.duel_result_received.connect(self.handle_duel_result_received)
 
         self.chat_widget.file_attachment_selected.connect(self.handle_file_attachment_selected)
+        self.socket_client.file_offered.connect(self.handle_file_offered)
+        self.socket_client.file_progress.connect(self.chat_widget.update_file_progress)
         self.socket_client.file_received.connect(self.handle_file_received)
 
 
@@ -496,7 +691,10 @@ class ChatWindow(QMainWindow):
 
 
     def register_with_selection(self, subject, role):
+        self.chat_widget.duel_topic = subject
+        self.chat_widget.follow_up_predictor.set_subject(subject)
         self.socket_client.register_with_server(subject, role)
+        self.question_pool.fill(subject)
 
 
     def handle_socket_message(self, message):
@@ -507,10 +705,17 @@ class ChatWindow(QMainWindow):
         self.chat_widget.send_status(status)
         self.chat_widget.set_partner_connected(self.socket_client.connected)
 
+        if self.socket_client.connected:
+            self.statusBar().clearMessage()
+
+
+    def handle_queue_position_changed(self, position):
+        self.statusBar().showMessage(f'Position {position} in queue')
+
 
     def handle_question_generated(self, question):
         if self.socket_client.send_question(question):
-            self.chat_widget.send_ai_message(question)
+            self.chat_widget.send_ai_message(question, from_stream=True)
 
 
     def handle_question_received(self, question):
@@ -518,11 +723,15 @@ class ChatWindow(QMainWindow):
 
 
     def handle_duel_requested(self, topic):
+        question = self.question_pool.take(topic)
+        if question:
+            self._on_duel_question_generated(question)
+            return
+
         worker = QuestionGeneratorWorker(topic)
         worker.finished.connect(self._on_duel_question_generated)
 
-        thread = threading.Thread(target=worker.run, daemon=True)
-        thread.start()
+        ai_pool.submit(worker, PRIORITY_DUEL, 'duel_question')
 
 
     def _on_duel_question_generated(self, question):
@@ -530,50 +739,93 @@ class ChatWindow(QMainWindow):
 
         if question.startswith('Error:'):
             self.chat_widget.send_status(question)
-        else:
-            if self.socket_client.send_duel_request(question):
-                self.chat_widget.show_duel_dialog(question)
+        elif self.socket_client.send_duel_request(question):
+            self.chat_widget.send_status('Starting duel...')
 
 
-    def handle_duel_request_received(self, question):
-        self.chat_widget.send_status('Duel challenge received!')
-        self.chat_widget.show_duel_dialog(question)
+    def handle_duel_request_received(self, duel):
+        if not duel.get('challenger'):
+            self.chat_widget.send_status('Duel challenge received!')
+
+        self.duel = {'duel_id': duel.get('duel_id'), 'question': duel.get('question', '')}
+        self.chat_widget.show_duel_dialog(self.duel['question'], duel.get('deadline'))
 
 
     def handle_duel_answer_submitted(self, question, answer):
-        worker = AnswerEvaluatorWorker(question, answer)
-        worker.finished.connect(self._on_duel_answer_evaluated)
+        if not self.duel or self.duel['question'] != question:
+            return
+
+        if self.socket_client.send_duel_answer(self.duel['duel_id'], answer):
+            self.chat_widget.set_duel_status('Waiting for your partner\'s answer...')
+
 
-        thread = threading.Thread(target=worker.run, daemon=True)
-        thread.start()
+    def handle_duel_answer_received(self, answers):
+        if not self.duel or self.duel['duel_id'] != answers.get('duel_id'):
+            return
 
+        self.chat_widget.set_duel_status('Evaluating both answers...')
 
-    def _on_duel_answer_evaluated(self, result):
-        score = result.get('score', 0)
-        feedback = result.get('feedback', '')
+        worker = DuelEvaluatorWorker(answers.get('question', ''), answers.get('own'), answers.get('partner'))
+        worker.finished.connect(self._on_duel_evaluated)
 
-        self.chat_widget.display_duel_score(score, feedback)
+        ai_pool.submit(worker, PRIORITY_DUEL, 'duel_answer')
 
-        self.socket_client.send_duel_score(score)
 
+    def _on_duel_evaluated(self, results):
+        if not self.duel:
+            return
 
-    def handle_duel_score_received(self, partner_score):
-        self.chat_widget.display_partner_duel_score(partner_score)
+        if not results:
+            self.socket_client.send_duel_failure(self.duel['duel_id'])
+            return
+
+        own, partner = results
+        self.socket_client.send_duel_result(self.duel['duel_id'], own, partner)
+
+
+    def handle_duel_result_received(self, result):
+        status = result.get('status')
+
+        if status == 'busy':
+            self.chat_widget.send_status('A duel is already in progress')
+            return
+
+        self.duel = None
+
+        if status == 'finished':
+            self.chat_widget.display_partner_duel_score(result.get('partner_score', 0))
+            self.chat_widget.display_duel_score(result.get('score', 0), result.get('feedback', ''))
+        elif status == 'cancelled':
+            self.chat_widget.end_duel('Your partner left the duel.')
+        elif status == 'failed':
+            self.chat_widget.end_duel('The answers could not be scored.')
+        else:
+            self.chat_widget.end_duel('The duel expired before it could be scored.')
 
 
     def handle_file_attachment_selected(self, file_path):
-        if self.socket_client.send_file(file_path):
-            filename = os.path.basename(file_path)
-            file_size = os.path.getsize(file_path)
-            self.chat_widget.send_file_message(filename, True, {'filename': filename, 'size': file_size})
+        transfer = self.socket_client.send_file(file_path)
+        if transfer:
+            file_data = {'filename': transfer.filename, 'size': transfer.size, 'transfer_id': transfer.transfer_id}
+            self.chat_widget.send_file_message(transfer.filename, True, file_data)
 
 
-    def handle_file_received(self, file_data):
+    def handle_file_offered(self, file_data):
         filename = file_data.get('filename', 'unknown')
         self.chat_widget.send_file_message(filename, False, file_data)
 
 
+    def handle_file_received(self, file_data):
+        self.chat_widget.complete_file_transfer(file_data.get('transfer_id'), file_data)
+
+
     def closeEvent(self, event):
+        stats = self.chat_widget.follow_up_scheduler.stats()
+        print(f'Follow-up calls: {stats["calls"]} for {stats["triggers"]} messages')
+        print(f'Follow-up suggestions accepted: {self.chat_widget.follow_up_accepted} of {self.chat_widget.follow_up_suggestions}')
+        if telemetry.features:
+            print(f'LLM telemetry:\n{telemetry.summary()}')
+            print(f'Telemetry written to {telemetry.dump()}')
         self.socket_client.disconnect_server()
         event.accept()
 
@@ -583,6 +835,8 @@ def main():
 
     app.setStyleSheet(style.get_stylesheet())
 
+    telemetry.start_reporter(TELEMETRY_INTERVAL)
+
     window = ChatWindow()
     window.showMaximized()
 
@@ -1,2 +1,53 @@
 SERVER_HOST = 'localhost'
-SERVER_PORT = 5555
\ No newline at end of file
+SERVER_PORT = 5555
+SERVER_ENGINE = 'threaded'
+MATCH_POLICY = 'fifo'
+MATCH_WINDOW = 32
+SPOOL_MAX_BYTES = 512 * 1024 * 1024
+SLOW_CONSUMER_POLICY = 'pause'
+OUTBOUND_HIGH_WATERMARK = 1024 * 1024
+OUTBOUND_LOW_WATERMARK = 256 * 1024
+AI_MAX_WORKERS = 2
+LLM_POOL_SIZE = 4
+LLM_CONNECT_TIMEOUT = 5
+LLM_READ_TIMEOUT = 60
+QUESTION_CACHE_TOPICS = 256
+QUESTION_CACHE_TTL = 7 * 24 * 3600
+QUESTION_CACHE_VARIETY = 3
+QUESTION_CACHE_PERSIST = True
+QUESTION_POOL_SIZE = 3
+QUESTION_POOL_LOW_WATERMARK = 1
+FOLLOW_UP_IDLE_MS = 800
+FOLLOW_UP_MAX_WAIT_MS = 3000
+QUESTION_BACKEND = 'gemini'
+EVALUATION_BACKEND = 'gemini'
+FOLLOW_UP_BACKEND = 'huggingface'
+FAKE_LATENCY = 0.3
+FAKE_JITTER = 0.2
+FAKE_ERROR_RATE = 0.0
+FAKE_SEED = 0
+LLM_DEADLINE = 20
+LLM_RETRIES = 2
+LLM_BACKOFF_BASE = 0.5
+LLM_BACKOFF_MAX = 4
+LLM_HEDGE_DELAY = 2.0
+EVALUATION_HEDGE = True
+TELEMETRY_INTERVAL = 60
+AI_GATEWAY = False
+AI_GATEWAY_BACKENDS = {'question': 'gemini', 'evaluate': 'gemini', 'follow_up': 'huggingface'}
+AI_GATEWAY_CONCURRENCY = 8
+AI_GATEWAY_CACHE_SIZE = 1024
+AI_GATEWAY_CACHE_TTL = 3600
+ANSWER_CACHE_THRESHOLD = 0.9
+ANSWER_CACHE_QUESTIONS = 256
+FOLLOW_UP_LOCAL_CONFIDENCE = 0.6
+FOLLOW_UP_CONTEXT_TOKENS = 600
+FOLLOW_UP_MESSAGE_TOKENS = 200
+FOLLOW_UP_SUMMARY_TOKENS = 120
+EVALUATION_STRUCTURED = True
+DUEL_ANSWER_TIMEOUT = 120
+DUEL_SCORING_TIMEOUT = 90
+DUEL_TIMER_TICK = 0.1
+TRANSFER_MAX_BYTES = 1024 * 1024 * 1024
+TRANSFER_PART_TTL = 24 * 3600
+AI_GATEWAY_CLIENT_CONCURRENCY = 4
\ No newline at end of file
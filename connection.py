@@ -0,0 +1,338 @@
+import select
+import selectors
+import socket
+import threading
+from collections import deque
+
+
+SLOW_CONSUMER_POLICIES = ('drop', 'disconnect', 'pause')
+MAX_WRITE_BUFFERS = 64
+MAX_WRITE_BYTES = 256 * 1024
+
+
+class OutboundQueue:
+
+    def __init__(self):
+        self.frames = deque()
+        self.size = 0
+        self.offset = 0
+
+
+    def push(self, data):
+        self.frames.append(data)
+        self.size += len(data)
+
+
+    def buffers(self):
+        result = []
+        total = 0
+        for i, frame in enumerate(self.frames):
+            view = memoryview(frame)[self.offset:] if i == 0 else memoryview(frame)
+            result.append(view)
+            total += len(view)
+            if len(result) >= MAX_WRITE_BUFFERS or total >= MAX_WRITE_BYTES:
+                break
+        return result
+
+
+    def consume(self, nbytes):
+        self.size -= nbytes
+        while nbytes:
+            remaining = len(self.frames[0]) - self.offset
+            if nbytes < remaining:
+                self.offset += nbytes
+                return
+            nbytes -= remaining
+            self.frames.popleft()
+            self.offset = 0
+
+
+    def clear(self):
+        self.frames.clear()
+        self.size = 0
+        self.offset = 0
+
+
+    def __bool__(self):
+        return bool(self.frames)
+
+
+class WriterLoop:
+
+    def __init__(self):
+        self.selector = selectors.DefaultSelector()
+        self.wake_reader, self.wake_writer = socket.socketpair()
+        self.wake_reader.setblocking(False)
+        self.wake_writer.setblocking(False)
+        self.selector.register(self.wake_reader, selectors.EVENT_READ)
+
+        self.lock = threading.Lock()
+        self.pending = set()
+        self.closing = set()
+
+        thread = threading.Thread(target=self.run, daemon=True)
+        thread.start()
+
+
+    def want_write(self, connection):
+        with self.lock:
+            self.pending.add(connection)
+        self.wake()
+
+
+    def want_close(self, connection):
+        with self.lock:
+            self.closing.add(connection)
+        self.wake()
+
+
+    def wake(self):
+        try:
+            self.wake_writer.send(b'\0')
+        except (BlockingIOError, InterruptedError):
+            pass
+
+
+    def run(self):
+        while True:
+            for key, _ in self.selector.select():
+                if key.fileobj is self.wake_reader:
+                    try:
+                        while self.wake_reader.recv(4096):
+                            pass
+                    except (BlockingIOError, InterruptedError):
+                        pass
+                elif key.data.flush():
+                    self.selector.unregister(key.fileobj)
+
+            with self.lock:
+                pending, self.pending = self.pending, set()
+                closing, self.closing = self.closing, set()
+
+            for connection in pending - closing:
+                if connection.flush():
+                    continue
+                try:
+                    self.selector.register(connection.sock, selectors.EVENT_WRITE, connection)
+                except KeyError:
+                    pass
+                except (ValueError, OSError):
+                    connection.fail()
+
+            for connection in closing:
+                try:
+                    self.selector.unregister(connection.sock)
+                except (KeyError, ValueError):
+                    pass
+                connection.sock.close()
+
+
+class SocketConnection:
+
+    def __init__(self, sock, writer, policy='pause', high_watermark=1024 * 1024, low_watermark=256 * 1024, pause_timeout=30):
+        self.sock = sock
+        self.writer = writer
+        self.policy = policy
+        self.high_watermark = high_watermark
+        self.low_watermark = low_watermark
+        self.pause_timeout = pause_timeout
+
+        self.queue = OutboundQueue()
+        self.lock = threading.Lock()
+        self.drained = threading.Condition(self.lock)
+        self.closed = False
+        self.dropped = 0
+
+        self.sock.setblocking(False)
+        self.poller = None
+        if hasattr(select, 'poll'):
+            self.poller = select.poll()
+            self.poller.register(self.sock, select.POLLIN)
+
+
+    def recv_into(self, buffer):
+        while True:
+            if self.poller:
+                self.poller.poll()
+            else:
+                select.select([self.sock], [], [])
+
+            try:
+                return self.sock.recv_into(buffer)
+            except (BlockingIOError, InterruptedError):
+                continue
+
+
+    def sendall(self, data, source=None, droppable=True):
+        policy = self.policy if droppable or self.policy != 'drop' else 'pause'
+
+        with self.lock:
+            if self.closed:
+                return False
+
+            if self.queue.size >= self.high_watermark:
+                if policy == 'drop':
+                    self.dropped += 1
+                    return False
+                elif policy == 'disconnect':
+                    print('Disconnecting slow consumer')
+                    self.fail_locked()
+                    return False
+
+            self.enqueue_locked(data)
+
+            if policy == 'pause' and self.queue.size > self.high_watermark:
+                if not self.drained.wait_for(lambda: self.closed or self.queue.size <= self.low_watermark, self.pause_timeout):
+                    print('Disconnecting slow consumer after pause timeout')
+                    self.fail_locked()
+        return True
+
+
+    def send_control(self, data):
+        with self.lock:
+            if self.closed:
+                return False
+            self.enqueue_locked(data)
+        return True
+
+
+    def enqueue_locked(self, data):
+        if not self.queue:
+            try:
+                sent = self.sock.send(data)
+            except (BlockingIOError, InterruptedError):
+                sent = 0
+            except OSError:
+                self.fail_locked()
+                return
+
+            if sent == len(data):
+                return
+            data = memoryview(data)[sent:]
+
+        self.queue.push(bytes(data))
+        self.writer.want_write(self)
+
+
+    def flush(self):
+        with self.lock:
+            if self.closed:
+                return True
+
+            while self.queue:
+                try:
+                    sent = self.send_buffers(self.queue.buffers())
+                except (BlockingIOError, InterruptedError):
+                    return False
+                except OSError:
+                    self.fail_locked()
+                    return True
+
+                self.queue.consume(sent)
+
+                if self.queue.size <= self.low_watermark:
+                    self.drained.notify_all()
+
+            return True
+
+
+    def send_buffers(self, buffers):
+        if hasattr(self.sock, 'sendmsg'):
+            return self.sock.sendmsg(buffers)
+        return self.sock.send(b''.join(buffers))
+
+
+    def fail(self):
+        with self.lock:
+            self.fail_locked()
+
+
+    def fail_locked(self):
+        if self.closed:
+            return
+
+        self.closed = True
+        self.queue.clear()
+        self.drained.notify_all()
+
+        try:
+            self.sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+
+
+    def close(self):
+        self.fail()
+        self.writer.want_close(self)
+
+
+class AsyncConnection:
+
+    def __init__(self, transport, policy='pause', high_watermark=1024 * 1024, low_watermark=256 * 1024):
+        self.transport = transport
+        self.policy = policy
+        self.transport.set_write_buffer_limits(high_watermark, low_watermark)
+
+        self.congested = False
+        self.paused_sources = set()
+        self.dropped = 0
+
+
+    def sendall(self, data, source=None, droppable=True):
+        if self.transport.is_closing():
+            return False
+
+        policy = self.policy if droppable or self.policy != 'drop' else 'pause'
+
+        if self.congested:
+            if policy == 'drop':
+                self.dropped += 1
+                return False
+            elif policy == 'disconnect':
+                print('Disconnecting slow consumer')
+                self.transport.abort()
+                return False
+            elif policy == 'pause' and source is not None and source is not self:
+                source.pause_reading()
+                self.paused_sources.add(source)
+
+        self.transport.write(bytes(data))
+        return True
+
+
+    def send_control(self, data):
+        if self.transport.is_closing():
+            return False
+
+        self.transport.write(bytes(data))
+        return True
+
+
+    def pause_writing(self):
+        self.congested = True
+
+
+    def resume_writing(self):
+        self.congested = False
+
+        for source in self.paused_sources:
+            source.resume_reading()
+        self.paused_sources.clear()
+
+
+    def pause_reading(self):
+        if not self.transport.is_closing():
+            self.transport.pause_reading()
+
+
+    def resume_reading(self):
+        if not self.transport.is_closing():
+            self.transport.resume_reading()
+
+
+    def close(self):
+        for source in self.paused_sources:
+            source.resume_reading()
+        self.paused_sources.clear()
+
+        self.transport.close()
@@ -0,0 +1,216 @@
+import itertools
+import threading
+import time
+
+from protocol import MessageType
+from chatbot.telemetry import telemetry
+
+
+CREATED = 'created'
+ANSWERING = 'answering'
+SCORING = 'scoring'
+FINISHED = 'finished'
+
+NO_ANSWER_FEEDBACK = 'No answer was submitted before the deadline.'
+
+
+class Duel:
+
+    def __init__(self, duel_id, challenger, opponent, question):
+        self.duel_id = duel_id
+        self.challenger = challenger
+        self.opponent = opponent
+        self.question = question
+        self.state = CREATED
+        self.answers = {}
+        self.timer = None
+        self.created_at = time.monotonic()
+        self.scoring_at = None
+
+
+    @property
+    def players(self):
+        return (self.challenger, self.opponent)
+
+
+def no_answer_result():
+    return {'score': 0, 'feedback': NO_ANSWER_FEEDBACK}
+
+
+def valid_result(result):
+    return (
+        isinstance(result, dict)
+        and isinstance(result.get('score'), int)
+        and not isinstance(result.get('score'), bool)
+        and 0 <= result['score'] <= 10
+        and isinstance(result.get('feedback', ''), str)
+    )
+
+
+class DuelEngine:
+
+    def __init__(self, send, wheel, answer_timeout=120, scoring_timeout=90, grade=None):
+        self.send = send
+        self.wheel = wheel
+        self.grade = grade
+        self.answer_timeout = answer_timeout
+        self.scoring_timeout = scoring_timeout
+        self.duels = {}
+        self.by_player = {}
+        self.counter = itertools.count(1)
+        self.lock = threading.RLock()
+
+
+    def create(self, challenger, opponent, question):
+        with self.lock:
+            if challenger in self.by_player or opponent in self.by_player:
+                return None
+
+            duel = Duel(next(self.counter), challenger, opponent, question)
+            self.duels[duel.duel_id] = duel
+            self.by_player[challenger] = duel
+            self.by_player[opponent] = duel
+
+            duel.state = ANSWERING
+            duel.timer = self.wheel.schedule(self.answer_timeout, self.expire, duel.duel_id, ANSWERING)
+
+            for player in duel.players:
+                self.send(player, {
+                    'type': MessageType.DUEL_REQUEST.value,
+                    'duel_id': duel.duel_id,
+                    'question': question,
+                    'deadline': self.answer_timeout,
+                    'challenger': player is challenger,
+                    'scorer': player is challenger and self.grade is None
+                })
+
+            telemetry.increment('duels_started')
+            return duel
+
+
+    def answer(self, player, duel_id, answer):
+        with self.lock:
+            duel = self.by_player.get(player)
+            if not duel or duel.duel_id != duel_id or duel.state != ANSWERING or player in duel.answers:
+                return False
+
+            duel.answers[player] = answer
+            if len(duel.answers) == len(duel.players):
+                self.begin_scoring(duel)
+            return True
+
+
+    def result(self, player, duel_id, own, partner):
+        with self.lock:
+            duel = self.by_player.get(player)
+            if self.grade or not duel or duel.duel_id != duel_id or duel.state != SCORING or player is not duel.challenger:
+                return False
+
+            results = {}
+            for target, result in ((duel.challenger, own), (duel.opponent, partner)):
+                if not duel.answers.get(target):
+                    result = no_answer_result()
+                elif not valid_result(result):
+                    return False
+                results[target] = result
+
+            self.finish(duel, FINISHED, results)
+            return True
+
+
+    def graded(self, duel_id, scored, error):
+        with self.lock:
+            duel = self.duels.get(duel_id)
+            if not duel or duel.state != SCORING:
+                return
+
+            if error or scored is None:
+                print(f'Duel {duel_id} could not be scored: {error}')
+                self.finish(duel, 'failed')
+                return
+
+            scored = iter(scored)
+            self.finish(duel, FINISHED, {player: next(scored) if duel.answers.get(player) else no_answer_result() for player in duel.players})
+
+
+    def fail(self, player, duel_id):
+        with self.lock:
+            duel = self.by_player.get(player)
+            if self.grade or not duel or duel.duel_id != duel_id or duel.state != SCORING or player is not duel.challenger:
+                return False
+
+            self.finish(duel, 'failed')
+            return True
+
+
+    def expire(self, duel_id, state):
+        with self.lock:
+            duel = self.duels.get(duel_id)
+            if not duel or duel.state != state:
+                return
+
+            if state == ANSWERING:
+                self.begin_scoring(duel)
+            else:
+                self.finish(duel, 'expired')
+
+
+    def leave(self, player):
+        with self.lock:
+            duel = self.by_player.get(player)
+            if duel:
+                self.finish(duel, 'cancelled', notify=[p for p in duel.players if p is not player])
+
+
+    def begin_scoring(self, duel):
+        self.wheel.cancel(duel.timer)
+
+        if not duel.answers:
+            self.finish(duel, 'expired')
+            return
+
+        duel.state = SCORING
+        duel.scoring_at = time.monotonic()
+        telemetry.record_timing('duel_answering', duel.scoring_at - duel.created_at)
+        duel.timer = self.wheel.schedule(self.scoring_timeout, self.expire, duel.duel_id, SCORING)
+
+        if self.grade:
+            pairs = [(duel.question, duel.answers[player]) for player in duel.players if duel.answers.get(player)]
+            self.grade(pairs, lambda scored, error: self.graded(duel.duel_id, scored, error))
+            return
+
+        self.send(duel.challenger, {
+            'type': MessageType.DUEL_ANSWER.value,
+            'duel_id': duel.duel_id,
+            'question': duel.question,
+            'own': duel.answers.get(duel.challenger),
+            'partner': duel.answers.get(duel.opponent)
+        })
+
+
+    def finish(self, duel, status, results=None, notify=None):
+        self.wheel.cancel(duel.timer)
+        duel.state = FINISHED
+        self.duels.pop(duel.duel_id, None)
+        for player in duel.players:
+            if self.by_player.get(player) is duel:
+                del self.by_player[player]
+
+        for player in duel.players if notify is None else notify:
+            message = {'type': MessageType.DUEL_RESULT.value, 'duel_id': duel.duel_id, 'status': status}
+            if results:
+                partner = duel.opponent if player is duel.challenger else duel.challenger
+                message['score'] = results[player]['score']
+                message['feedback'] = results[player].get('feedback', '')
+                message['partner_score'] = results[partner]['score']
+            self.send(player, message)
+
+        finished_at = time.monotonic()
+        total = finished_at - duel.created_at
+        telemetry.increment(f'duels_{status}')
+        telemetry.record_timing('duel_total', total)
+        if duel.scoring_at is not None:
+            telemetry.record_timing('duel_scoring', finished_at - duel.scoring_at)
+            print(f'Duel {duel.duel_id} {status} in {total:.1f}s (scoring {finished_at - duel.scoring_at:.1f}s)')
+        else:
+            print(f'Duel {duel.duel_id} {status} in {total:.1f}s')
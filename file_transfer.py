@@ -0,0 +1,173 @@
+import hashlib
+import os
+import re
+import tempfile
+import threading
+import time
+
+from protocol import MessageType, encode_message
+
+
+FILE_CHUNK_SIZE = 65536
+FILE_WINDOW_SIZE = 512 * 1024
+FILE_ACK_INTERVAL = 128 * 1024
+TRANSFER_DIR = os.path.join(tempfile.gettempdir(), 'tutorme', 'transfers')
+TRANSFER_ID_PATTERN = re.compile(r'[0-9a-f]{16}')
+
+
+def make_transfer_id(path):
+    stat = os.stat(path)
+    identity = f'{os.path.abspath(path)}:{stat.st_size}:{stat.st_mtime_ns}'
+    return hashlib.sha1(identity.encode('utf-8')).hexdigest()[:16]
+
+
+def valid_transfer_id(transfer_id):
+    return isinstance(transfer_id, str) and TRANSFER_ID_PATTERN.fullmatch(transfer_id) is not None
+
+
+def prune_partial_files(directory=TRANSFER_DIR, max_age=24 * 3600):
+    if not os.path.isdir(directory):
+        return
+
+    cutoff = time.time() - max_age
+    for name in os.listdir(directory):
+        path = os.path.join(directory, name)
+        try:
+            if name.endswith('.part') and os.path.getmtime(path) < cutoff:
+                os.remove(path)
+        except OSError as e:
+            print(f'[ERROR] Failed to remove stale partial file {path}: {e}')
+
+
+class OutgoingTransfer:
+
+    def __init__(self, path):
+        self.path = path
+        self.filename = os.path.basename(path)
+        self.size = os.path.getsize(path)
+        self.transfer_id = make_transfer_id(path)
+
+        self.sent = 0
+        self.acked = 0
+        self.cancelled = False
+        self.condition = threading.Condition()
+
+
+    def offer(self):
+        return {
+            'type': MessageType.FILE_OFFER.value,
+            'transfer_id': self.transfer_id,
+            'filename': self.filename,
+            'size': self.size
+        }
+
+
+    def run(self, offset, send_frame):
+        with self.condition:
+            self.sent = offset
+            self.acked = offset
+
+        with open(self.path, 'rb') as f:
+            f.seek(offset)
+
+            while self.sent < self.size:
+                with self.condition:
+                    while not self.cancelled and self.sent - self.acked >= FILE_WINDOW_SIZE:
+                        self.condition.wait()
+
+                    if self.cancelled:
+                        return False
+
+                chunk = f.read(min(FILE_CHUNK_SIZE, self.size - self.sent))
+                if not chunk:
+                    raise IOError(f'File changed while sending ({self.sent} of {self.size} bytes sent)')
+
+                chunk_message = {
+                    'type': MessageType.FILE_CHUNK.value,
+                    'transfer_id': self.transfer_id,
+                    'offset': self.sent
+                }
+                send_frame(encode_message(chunk_message, chunk))
+                self.sent += len(chunk)
+
+        return True
+
+
+    def acknowledge(self, offset):
+        with self.condition:
+            self.acked = max(self.acked, offset)
+            self.condition.notify_all()
+
+
+    def cancel(self):
+        with self.condition:
+            self.cancelled = True
+            self.condition.notify_all()
+
+
+    @property
+    def done(self):
+        return self.acked >= self.size
+
+
+class IncomingTransfer:
+
+    def __init__(self, transfer_id, filename, size, directory=TRANSFER_DIR, max_bytes=None):
+        if not valid_transfer_id(transfer_id):
+            raise ValueError(f'Invalid transfer id: {transfer_id!r}')
+        if isinstance(size, bool) or not isinstance(size, int) or size < 0:
+            raise ValueError(f'Invalid file size: {size!r}')
+        if max_bytes is not None and size > max_bytes:
+            raise ValueError(f'File of {size} bytes exceeds the {max(0, max_bytes)} bytes still allowed')
+
+        self.transfer_id = transfer_id
+        self.filename = os.path.basename(filename) or 'download'
+        self.size = size
+        self.directory = directory
+
+        os.makedirs(directory, exist_ok=True)
+        self.part_path = os.path.join(directory, f'{transfer_id}.part')
+
+        self.file = open(self.part_path, 'ab')
+        self.received = self.file.tell()
+        if self.received > size:
+            self.file.truncate(0)
+            self.received = 0
+        self.acked = self.received
+
+
+    def write(self, offset, data):
+        if offset != self.received:
+            return False
+
+        self.file.write(data)
+        self.received += len(data)
+
+        if self.received - self.acked >= FILE_ACK_INTERVAL or self.complete:
+            self.acked = self.received
+            return True
+        return False
+
+
+    def ack(self):
+        return {
+            'type': MessageType.FILE_ACK.value,
+            'transfer_id': self.transfer_id,
+            'offset': self.received
+        }
+
+
+    @property
+    def complete(self):
+        return self.received >= self.size
+
+
+    def finish(self):
+        self.file.close()
+        return self.part_path
+
+
+    def close(self, remove=False):
+        self.file.close()
+        if remove and os.path.exists(self.part_path):
+            os.remove(self.part_path)
@@ -0,0 +1,139 @@
+import itertools
+import time
+from collections import OrderedDict
+
+
+ROLE_ALIASES = {
+    'tutor': 'teach',
+    'learner': 'learn'
+}
+
+
+ROLE_NAMES = {
+    'learn': 'learner',
+    'teach': 'tutor'
+}
+
+
+def normalize_role(role):
+    return ROLE_ALIASES.get(role, role)
+
+
+def partner_role_of(role):
+    return 'teach' if normalize_role(role) == 'learn' else 'learn'
+
+
+def role_name(role):
+    return ROLE_NAMES.get(normalize_role(role), role)
+
+
+class Ticket:
+
+    def __init__(self, client, subject, role, since=None):
+        self.client = client
+        self.subject = subject
+        self.role = normalize_role(role)
+        self.enqueued_at = time.monotonic()
+        self.since = since if since is not None else self.enqueued_at
+
+
+    @property
+    def key(self):
+        return (self.subject, self.role)
+
+
+class FifoPolicy:
+
+    def select(self, candidates, matchmaker):
+        return candidates[0]
+
+
+class LongestWaitPolicy:
+
+    def select(self, candidates, matchmaker):
+        return min(candidates, key=lambda ticket: ticket.since)
+
+
+class TutorLoadPolicy:
+
+    def select(self, candidates, matchmaker):
+        return min(candidates, key=lambda ticket: (matchmaker.load.get(ticket.client, 0), ticket.since))
+
+
+POLICIES = {
+    'fifo': FifoPolicy,
+    'longest_wait': LongestWaitPolicy,
+    'tutor_load': TutorLoadPolicy
+}
+
+
+class Matchmaker:
+
+    def __init__(self, policy='fifo', window=32):
+        if policy not in POLICIES:
+            raise ValueError(f'Unknown matchmaking policy: {policy}')
+
+        self.policy = POLICIES[policy]()
+        self.window = max(1, window)
+
+        self.queues = {}
+        self.tickets = {}
+        self.load = {}
+
+
+    def enqueue(self, client, subject, role, since=None):
+        self.cancel(client)
+
+        ticket = Ticket(client, subject, role, since)
+        queue = self.queues.get(ticket.key)
+        if queue is None:
+            queue = self.queues[ticket.key] = OrderedDict()
+
+        queue[client] = ticket
+        self.tickets[client] = ticket
+        return len(queue)
+
+
+    def match(self, subject, role):
+        queue = self.queues.get((subject, partner_role_of(role)))
+        if not queue:
+            return None
+
+        candidates = list(itertools.islice(queue.values(), self.window))
+        ticket = self.policy.select(candidates, self)
+        self.cancel(ticket.client)
+        return ticket
+
+
+    def cancel(self, client):
+        ticket = self.tickets.pop(client, None)
+        if ticket is None:
+            return None
+
+        queue = self.queues[ticket.key]
+        del queue[client]
+        if not queue:
+            del self.queues[ticket.key]
+        return ticket
+
+
+    def record_match(self, *clients_and_roles):
+        for client, role in clients_and_roles:
+            if normalize_role(role) == 'teach':
+                self.load[client] = self.load.get(client, 0) + 1
+
+
+    def forget(self, client):
+        self.load.pop(client, None)
+        return self.cancel(client)
+
+
+    def head(self, subject, role, limit=None):
+        queue = self.queues.get((subject, normalize_role(role)))
+        if not queue:
+            return []
+        return list(itertools.islice(queue.values(), limit or self.window))
+
+
+    def __len__(self):
+        return len(self.tickets)
@@ -0,0 +1,163 @@
+import json
+import struct
+from enum import Enum
+
+
+FRAME_HEADER = struct.Struct('!II')
+RECV_CHUNK_SIZE = 16384
+MAX_HEADER_SIZE = 65536
+MAX_FRAME_SIZE = 16 * 1024 * 1024
+HEADER_FIELDS = ('type', 'subject', 'role', 'filename', 'size', 'transfer_id', 'offset')
+
+
+class MessageType(Enum):
+    CHAT = 'chat'
+    STATUS = 'status'
+    SYSTEM = 'system'
+    REGISTER = 'register'
+    QUESTION = 'question'
+    DUEL_REQUEST = 'duel_request'
+    DUEL_ANSWER = 'duel_answer'
+    DUEL_RESULT = 'duel_result'
+    FILE_OFFER = 'file_offer'
+    FILE_ACCEPT = 'file_accept'
+    FILE_CHUNK = 'file_chunk'
+    FILE_ACK = 'file_ack'
+    FILE_CANCEL = 'file_cancel'
+    AI_REQUEST = 'ai_request'
+    AI_RESPONSE = 'ai_response'
+
+
+FILE_TRANSFER_TYPES = {
+    MessageType.FILE_OFFER.value,
+    MessageType.FILE_ACCEPT.value,
+    MessageType.FILE_CHUNK.value,
+    MessageType.FILE_ACK.value,
+    MessageType.FILE_CANCEL.value
+}
+
+
+class FrameError(Exception):
+    pass
+
+
+def encode_header(header, body_length):
+    header_bytes = json.dumps(header).encode('utf-8')
+    return FRAME_HEADER.pack(len(header_bytes), body_length) + header_bytes
+
+
+def encode_message(message_dict, body=None):
+    header = {field: message_dict[field] for field in HEADER_FIELDS if field in message_dict}
+
+    if body is None:
+        fields = {key: value for key, value in message_dict.items() if key not in header}
+        body = json.dumps(fields).encode('utf-8') if fields else b''
+    else:
+        header['binary'] = True
+
+    return encode_header(header, len(body)) + body
+
+
+def decode_header(frame):
+    (header_length, _) = FRAME_HEADER.unpack_from(frame)
+    return json.loads(str(frame[FRAME_HEADER.size:FRAME_HEADER.size + header_length], 'utf-8'))
+
+
+def frame_body(frame):
+    (header_length, _) = FRAME_HEADER.unpack_from(frame)
+    return frame[FRAME_HEADER.size + header_length:]
+
+
+def decode_message(frame):
+    message_dict = decode_header(frame)
+    body = frame_body(frame)
+
+    if message_dict.pop('binary', False):
+        message_dict['data'] = bytes(body)
+    elif body:
+        message_dict.update(json.loads(str(body, 'utf-8')))
+
+    return message_dict
+
+
+class FrameDecoder:
+
+    def __init__(self, capacity=RECV_CHUNK_SIZE, max_frame_size=MAX_FRAME_SIZE):
+        self.capacity = capacity
+        self.max_frame_size = max_frame_size
+        self.buffer = bytearray(capacity)
+        self.view = memoryview(self.buffer)
+        self.start = 0
+        self.end = 0
+
+
+    def get_buffer(self, size_hint=-1):
+        size = RECV_CHUNK_SIZE if size_hint <= 0 else min(size_hint, RECV_CHUNK_SIZE)
+        if len(self.buffer) - self.end < size:
+            self.reserve(self.end - self.start + size)
+        return self.view[self.end:self.end + size]
+
+
+    def buffer_updated(self, nbytes):
+        self.end += nbytes
+
+
+    def feed(self, data):
+        data = memoryview(data)
+        while data:
+            chunk = self.get_buffer(len(data))
+            n = len(chunk)
+            chunk[:] = data[:n]
+            self.buffer_updated(n)
+            data = data[n:]
+
+
+    def frames(self):
+        while True:
+            available = self.end - self.start
+            if available < FRAME_HEADER.size:
+                break
+
+            (header_length, body_length) = FRAME_HEADER.unpack_from(self.buffer, self.start)
+            if header_length > MAX_HEADER_SIZE:
+                raise FrameError(f'Header of {header_length} bytes exceeds limit of {MAX_HEADER_SIZE}')
+
+            length = header_length + body_length
+            if length > self.max_frame_size:
+                raise FrameError(f'Frame of {length} bytes exceeds limit of {self.max_frame_size}')
+
+            frame_size = FRAME_HEADER.size + length
+            if available < frame_size:
+                if len(self.buffer) - self.start < frame_size:
+                    self.reserve(frame_size)
+                break
+
+            frame = self.view[self.start:self.start + frame_size]
+            self.start += frame_size
+            yield frame
+
+        if self.start == self.end:
+            self.start = 0
+            self.end = 0
+            if len(self.buffer) > self.capacity:
+                self.resize(self.capacity)
+
+
+    def reserve(self, size):
+        pending = self.end - self.start
+
+        if size > len(self.buffer):
+            self.resize(max(size, len(self.buffer) * 2), pending)
+        elif self.start > 0:
+            self.buffer[:pending] = bytes(self.view[self.start:self.end])
+            self.start = 0
+            self.end = pending
+
+
+    def resize(self, size, pending=0):
+        buffer = bytearray(size)
+        buffer[:pending] = self.view[self.start:self.start + pending]
+        self.buffer = buffer
+        self.view = memoryview(self.buffer)
+        self.start = 0
+        self.end = pending
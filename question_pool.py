@@ -0,0 +1,113 @@
+import threading
+from collections import deque
+
+from ai_pool import PRIORITY_PREFETCH
+from chatbot.question_cache import normalize_topic
+
+
+class PrefetchJob:
+
+    feature = 'prefetch'
+
+
+    def __init__(self, pool, key, topic):
+        self.pool = pool
+        self.key = key
+        self.topic = topic
+        self.cancelled = False
+
+
+    def cancel(self):
+        self.cancelled = True
+
+
+    def run(self):
+        question = None
+        try:
+            if not self.cancelled:
+                question = self.pool.generate(self.topic)
+        finally:
+            self.pool.finish(self.key, self.topic, question)
+
+
+class QuestionPool:
+
+    def __init__(self, generate, workers, size=3, low_watermark=1, cache=None):
+        self.generate = generate
+        self.workers = workers
+        self.cache = cache
+        self.size = max(1, size)
+        self.low_watermark = min(low_watermark, self.size - 1)
+        self.questions = {}
+        self.in_flight = {}
+        self.prefilled = set()
+        self.pending = deque()
+        self.running = None
+        self.lock = threading.Lock()
+
+
+    def fill(self, topic):
+        key = normalize_topic(topic)
+        if not key:
+            return
+
+        with self.lock:
+            seed = key not in self.prefilled
+            self.prefilled.add(key)
+
+        cached = self.cache.questions(topic) if seed and self.cache else []
+
+        with self.lock:
+            questions = self.questions.setdefault(key, deque())
+            for question in cached:
+                if len(questions) < self.size and question not in questions:
+                    questions.append(question)
+
+            missing = self.size - len(questions) - self.in_flight.get(key, 0)
+            if missing <= 0:
+                return
+            self.in_flight[key] = self.in_flight.get(key, 0) + missing
+            self.pending.extend([(key, topic)] * missing)
+
+        self.start_next()
+
+
+    def start_next(self):
+        with self.lock:
+            if self.running or not self.pending:
+                return
+            key, topic = self.pending.popleft()
+            self.running = PrefetchJob(self, key, topic)
+            job = self.running
+
+        self.workers.submit(job, PRIORITY_PREFETCH)
+
+
+    def finish(self, key, topic, question):
+        with self.lock:
+            self.running = None
+            self.in_flight[key] -= 1
+            if not self.in_flight[key]:
+                del self.in_flight[key]
+
+            stored = bool(question) and not question.startswith('Error:')
+            if stored:
+                self.questions.setdefault(key, deque()).append(question)
+
+        if stored and self.cache:
+            self.cache.put(topic, question)
+        self.start_next()
+
+
+    def take(self, topic):
+        key = normalize_topic(topic)
+
+        with self.lock:
+            questions = self.questions.get(key)
+            question = questions.popleft() if questions else None
+            remaining = len(questions) if questions else 0
+            prefilled = key in self.prefilled
+
+        if prefilled and remaining <= self.low_watermark:
+            self.fill(topic)
+        return question
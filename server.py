@@ -1,193 +1,103 @@
-from config import SERVER_HOST, SERVER_PORT
+from config import SERVER_HOST, SERVER_PORT, SERVER_ENGINE, MATCH_POLICY, MATCH_WINDOW, SLOW_CONSUMER_POLICY, OUTBOUND_HIGH_WATERMARK, OUTBOUND_LOW_WATERMARK
+from config import AI_GATEWAY, AI_GATEWAY_BACKENDS, AI_GATEWAY_CONCURRENCY, AI_GATEWAY_CACHE_SIZE, AI_GATEWAY_CACHE_TTL, AI_GATEWAY_CLIENT_CONCURRENCY, QUESTION_CACHE_VARIETY, TELEMETRY_INTERVAL
+from config import DUEL_ANSWER_TIMEOUT, DUEL_SCORING_TIMEOUT, DUEL_TIMER_TICK, ANSWER_CACHE_THRESHOLD, ANSWER_CACHE_QUESTIONS
 
+import argparse
+import asyncio
 import json
 import socket
 import threading
-from enum import Enum
+import time
 
+from protocol import MessageType, FILE_TRANSFER_TYPES, FrameDecoder, FrameError, encode_message, decode_header, decode_message
+from matchmaking import Matchmaker, POLICIES, normalize_role, partner_role_of, role_name
+from connection import SocketConnection, AsyncConnection, WriterLoop, SLOW_CONSUMER_POLICIES
+from duel import DuelEngine
+from timer_wheel import TimerWheel
+from chatbot.telemetry import telemetry
 
-class MessageType(Enum):
-    CHAT = 'chat'
-    STATUS = 'status'
-    SYSTEM = 'system'
-    REGISTER = 'register'
-    QUESTION = 'question'
-    DUEL_REQUEST = 'duel_request'
-    DUEL_SCORE = 'duel_score'
-    FILE_ATTACHMENT = 'file_attachment'
+
+class Session:
+
+    def __init__(self, first, second, subject):
+        self.first = first
+        self.second = second
+        self.subject = subject
+        self.started_at = time.monotonic()
+
+
+    def partner_of(self, client_socket):
+        return self.second if client_socket is self.first else self.first
 
 
 class ChatServer:
 
-    def __init__(self, host=SERVER_HOST, port=SERVER_PORT):
+    def __init__(self, host=SERVER_HOST, port=SERVER_PORT, match_policy=MATCH_POLICY, slow_consumer_policy=SLOW_CONSUMER_POLICY, ai_gateway=AI_GATEWAY):
         self.host = host
         self.port = port
+        self.slow_consumer_policy = slow_consumer_policy
+        self.writer = None
+        self.loop = None
+        self.loop_thread = None
+
+        self.gateway = None
+        self.ai_lock = threading.Lock()
+        self.ai_in_flight = {}
+        if ai_gateway:
+            from ai_gateway import AIGateway
+            self.gateway = AIGateway(AI_GATEWAY_BACKENDS, AI_GATEWAY_CONCURRENCY, AI_GATEWAY_CACHE_SIZE, AI_GATEWAY_CACHE_TTL, QUESTION_CACHE_VARIETY, ANSWER_CACHE_THRESHOLD, ANSWER_CACHE_QUESTIONS)
 
         self.server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
         self.server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
 
         self.lock = threading.Lock()
 
-        self.waiting_clients = {}
+        self.matchmaker = Matchmaker(match_policy, MATCH_WINDOW)
         self.client_info = {}
-        self.active_pairs = []
+        self.sessions = {}
+
+        self.timers = TimerWheel(DUEL_TIMER_TICK)
+        self.duels = DuelEngine(self.send_threadsafe, self.timers, DUEL_ANSWER_TIMEOUT, DUEL_SCORING_TIMEOUT, self.gateway.evaluate if self.gateway else None)
 
 
     def start(self):
         self.server_socket.bind((self.host, self.port))
-        self.server_socket.listen(5)
+        self.server_socket.listen(socket.SOMAXCONN)
 
         print(f'Server started on {self.host}:{self.port}')
         print('Waiting for clients to connect...')
 
+        self.writer = WriterLoop()
+        self.timers.start()
+
         while True:
             client_socket, address = self.server_socket.accept()
 
             print(f'New connection from {address}')
 
-            client_thread = threading.Thread(target=self.handle_client, args=(client_socket, address))
+            client_socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            connection = SocketConnection(client_socket, self.writer, self.slow_consumer_policy, OUTBOUND_HIGH_WATERMARK, OUTBOUND_LOW_WATERMARK)
+
+            client_thread = threading.Thread(target=self.handle_client, args=(connection, address))
             client_thread.daemon = True
 
             client_thread.start()
 
 
     def handle_client(self, client_socket, address):
-        try:
-            registered = False
+        decoder = FrameDecoder()
 
+        try:
             while True:
-                data = client_socket.recv(1048576 * 256)  # 256MB buffer for file attachments
+                nbytes = client_socket.recv_into(decoder.get_buffer())
 
-                if not data:
+                if not nbytes:
                     break
 
-                try:
-                    message_dict = json.loads(data.decode('utf-8'))
-
-                    if 'type' not in message_dict:
-                        print(f'Invalid message format from {address}: missing type field')
-                        continue
-
-                    msg_type = message_dict.get('type')
-
-                    if msg_type == MessageType.REGISTER.value and not registered:
-                        subject = message_dict.get('subject')
-                        role = message_dict.get('role')
-
-                        if not subject or not role:
-                            print(f'Invalid registration from {address}')
-                            continue
-
-                        print(f'Client {address} registered: subject={subject}, role={role}')
-
-                        with self.lock:
-                            self.client_info[client_socket] = {'subject': subject, 'role': role}
-
-                            partner_role = 'tutor' if role == 'learn' else 'learn'
-                            match_key = (subject, partner_role)
-
-                            if match_key in self.waiting_clients and len(self.waiting_clients[match_key]) > 0:
-                                partner_socket = self.waiting_clients[match_key].pop(0)
-
-                                if len(self.waiting_clients[match_key]) == 0:
-                                    del self.waiting_clients[match_key]
-
-                                pair = (client_socket, partner_socket)
-                                self.active_pairs.append(pair)
-
-                                print(f'Matched two clients for {subject}: {role} <-> {partner_role}')
-
-                                self.send_status(client_socket, 'connected', 'Connected! You can now chat.')
-                                self.send_status(partner_socket, 'connected', 'Connected! You can now chat.')
-                            else:
-                                wait_key = (subject, role)
-                                if wait_key not in self.waiting_clients:
-                                    self.waiting_clients[wait_key] = []
-                                self.waiting_clients[wait_key].append(client_socket)
-
-                                print(f'Client {address} waiting for: subject={subject}, looking for={partner_role}')
-                                self.send_status(client_socket, 'waiting', f'Waiting for a {partner_role} in {subject}...')
-
-                        registered = True
-
-                    elif msg_type == MessageType.CHAT.value:
-                        if not registered:
-                            print(f'Client {address} tried to chat without registering')
-                            continue
-
-                        partner = self.find_partner(client_socket)
-                        if partner:
-                            try:
-                                partner.send(data)
-                            except:
-                                print('Failed to send message to partner')
-                                break
-
-                    elif msg_type == MessageType.QUESTION.value:
-                        if not registered:
-                            print(f'Client {address} tried to send question without registering')
-                            continue
-
-                        partner = self.find_partner(client_socket)
-                        if partner:
-                            try:
-                                partner.send(data)
-                                print(f'Question forwarded to partner')
-                            except:
-                                print('Failed to send question to partner')
-                                break
-
-                    elif msg_type == MessageType.DUEL_REQUEST.value:
-                        if not registered:
-                            print(f'Client {address} tried to send duel request without registering')
-                            continue
-
-                        partner = self.find_partner(client_socket)
-                        if partner:
-                            try:
-                                partner.send(data)
-                                print(f'Duel request forwarded to partner')
-                            except:
-                                print('Failed to send duel request to partner')
-                                break
-
-                    elif msg_type == MessageType.DUEL_SCORE.value:
-                        if not registered:
-                            print(f'Client {address} tried to send duel score without registering')
-                            continue
-
-                        partner = self.find_partner(client_socket)
-                        if partner:
-                            try:
-                                partner.send(data)
-                                print(f'Duel score forwarded to partner')
-                            except:
-                                print('Failed to send duel score to partner')
-                                break
-
-                    elif msg_type == MessageType.FILE_ATTACHMENT.value:
-                        if not registered:
-                            print(f'Client {address} tried to send file without registering')
-                            continue
-
-                        partner = self.find_partner(client_socket)
-                        if partner:
-                            try:
-                                partner.send(data)
-                                filename = message_dict.get('filename', 'file')
-                                print(f'File attachment "{filename}" forwarded to partner')
-                            except:
-                                print('Failed to send file attachment to partner')
-                                break
-                    else:
-                        print(f'Ignoring message type: {msg_type}')
+                decoder.buffer_updated(nbytes)
 
-                except json.JSONDecodeError:
-                    print(f'Invalid JSON from {address}')
-                    continue
-                except Exception as e:
-                    print(f'Error processing message from {address}: {e}')
-                    continue
+                if not self.handle_frames(client_socket, address, decoder):
+                    break
 
         except Exception as e:
             print(f'Error handling client {address}: {e}')
@@ -199,52 +109,267 @@ class ChatServer:
             print(f'Client {address} disconnected')
 
 
+    def handle_frames(self, client_socket, address, decoder):
+        try:
+            for frame in decoder.frames():
+                if not self.handle_frame(client_socket, address, frame):
+                    return False
+        except FrameError as e:
+            print(f'Invalid frame from {address}: {e}')
+            return False
+        return True
+
+
+    def handle_frame(self, client_socket, address, data):
+        registered = client_socket in self.client_info
+
+        try:
+            header = decode_header(data)
+
+            if 'type' not in header:
+                print(f'Invalid message format from {address}: missing type field')
+                return True
+
+            msg_type = header.get('type')
+
+            if msg_type == MessageType.REGISTER.value and not registered:
+                subject = header.get('subject')
+                role = header.get('role')
+
+                if not subject or not role:
+                    print(f'Invalid registration from {address}')
+                    return True
+
+                print(f'Client {address} registered: subject={subject}, role={role}')
+
+                with self.lock:
+                    self.client_info[client_socket] = {'subject': subject, 'role': normalize_role(role), 'since': time.monotonic()}
+                    self.match_or_enqueue(client_socket, subject, role)
+
+            elif msg_type == MessageType.CHAT.value:
+                if not registered:
+                    print(f'Client {address} tried to chat without registering')
+                    return True
+
+                partner = self.find_partner(client_socket)
+                if partner:
+                    try:
+                        partner.sendall(data, client_socket)
+                    except:
+                        print('Failed to send message to partner')
+                        return False
+
+            elif msg_type == MessageType.QUESTION.value:
+                if not registered:
+                    print(f'Client {address} tried to send question without registering')
+                    return True
+
+                partner = self.find_partner(client_socket)
+                if partner:
+                    try:
+                        partner.sendall(data, client_socket)
+                        print(f'Question forwarded to partner')
+                    except:
+                        print('Failed to send question to partner')
+                        return False
+
+            elif msg_type in (MessageType.DUEL_REQUEST.value, MessageType.DUEL_ANSWER.value, MessageType.DUEL_RESULT.value):
+                if not registered:
+                    print(f'Client {address} tried to send duel {msg_type} without registering')
+                    return True
+
+                self.handle_duel_message(client_socket, decode_message(data))
+
+            elif msg_type in FILE_TRANSFER_TYPES:
+                if not registered:
+                    print(f'Client {address} tried to send file without registering')
+                    return True
+
+                partner = self.find_partner(client_socket)
+                if partner:
+                    try:
+                        partner.sendall(data, client_socket, droppable=False)
+                        if msg_type == MessageType.FILE_OFFER.value:
+                            filename = header.get('filename', 'file')
+                            print(f'File offer "{filename}" ({header.get("size", 0)} bytes) forwarded to partner')
+                    except:
+                        print('Failed to send file transfer message to partner')
+                        return False
+            elif msg_type == MessageType.AI_REQUEST.value:
+                if not registered:
+                    print(f'Client {address} tried to send AI request without registering')
+                    self.send_message(client_socket, {'type': MessageType.AI_RESPONSE.value, 'request_id': decode_message(data).get('request_id'), 'error': 'Register before sending AI requests'})
+                    return True
+
+                self.handle_ai_request(client_socket, decode_message(data))
+
+            else:
+                print(f'Ignoring message type: {msg_type}')
+
+        except json.JSONDecodeError:
+            print(f'Invalid JSON from {address}')
+        except Exception as e:
+            print(f'Error processing message from {address}: {e}')
+
+        return True
+
+
+    def handle_ai_request(self, client_socket, message):
+        request_id = message.get('request_id')
+        counted = False
+
+        def reply(text, error):
+            if counted:
+                with self.ai_lock:
+                    remaining = self.ai_in_flight.get(client_socket, 0) - 1
+                    if remaining > 0:
+                        self.ai_in_flight[client_socket] = remaining
+                    else:
+                        self.ai_in_flight.pop(client_socket, None)
+
+            response = {'type': MessageType.AI_RESPONSE.value, 'request_id': request_id}
+            if error:
+                response['error'] = error
+            else:
+                response['text'] = text
+            self.send_threadsafe(client_socket, response)
+
+        if not self.gateway:
+            reply(None, 'AI gateway is not enabled on this server')
+            return
+
+        prompt = message.get('prompt')
+        if not isinstance(prompt, str) or not prompt:
+            reply(None, 'Missing prompt')
+            return
+
+        schema = message.get('schema')
+        if schema is not None and not isinstance(schema, dict):
+            reply(None, 'Invalid response schema')
+            return
+
+        with self.ai_lock:
+            if self.ai_in_flight.get(client_socket, 0) >= AI_GATEWAY_CLIENT_CONCURRENCY:
+                busy = True
+            else:
+                busy = False
+                self.ai_in_flight[client_socket] = self.ai_in_flight.get(client_socket, 0) + 1
+        if busy:
+            reply(None, f'Too many AI requests in flight (limit {AI_GATEWAY_CLIENT_CONCURRENCY})')
+            return
+        counted = True
+
+        self.gateway.submit(message.get('feature'), prompt, reply, schema)
+
+
+    def handle_duel_message(self, client_socket, message):
+        msg_type = message.get('type')
+
+        if msg_type == MessageType.DUEL_REQUEST.value:
+            partner = self.find_partner(client_socket)
+            question = message.get('question')
+            if not partner or not isinstance(question, str) or not question:
+                return
+
+            if not self.duels.create(client_socket, partner, question):
+                self.send_message(client_socket, {'type': MessageType.DUEL_RESULT.value, 'status': 'busy'})
+
+        elif msg_type == MessageType.DUEL_ANSWER.value:
+            answer = message.get('answer')
+            if isinstance(answer, str):
+                self.duels.answer(client_socket, message.get('duel_id'), answer)
+
+        elif msg_type == MessageType.DUEL_RESULT.value and message.get('failed'):
+            self.duels.fail(client_socket, message.get('duel_id'))
+
+        elif msg_type == MessageType.DUEL_RESULT.value:
+            if not self.duels.result(client_socket, message.get('duel_id'), message.get('own'), message.get('partner')):
+                print('Ignoring invalid duel result')
+
+
+    def send_threadsafe(self, client_socket, message_dict):
+        if self.loop and threading.current_thread() is not self.loop_thread:
+            self.loop.call_soon_threadsafe(self.send_message, client_socket, message_dict)
+        else:
+            self.send_message(client_socket, message_dict)
+
+
+    def match_or_enqueue(self, client_socket, subject, role, since=None):
+        ticket = self.matchmaker.match(subject, role)
+
+        if ticket:
+            partner_socket = ticket.client
+
+            session = Session(client_socket, partner_socket, subject)
+            self.sessions[client_socket] = session
+            self.sessions[partner_socket] = session
+            self.matchmaker.record_match((client_socket, role), (partner_socket, ticket.role))
+
+            print(f'Matched two clients for {subject}: {role_name(role)} <-> {role_name(ticket.role)}')
+
+            self.send_status(client_socket, 'connected', 'Connected! You can now chat.')
+            self.send_status(partner_socket, 'connected', 'Connected! You can now chat.')
+
+            self.send_queue_positions(ticket.subject, ticket.role)
+        else:
+            position = self.matchmaker.enqueue(client_socket, subject, role, since)
+            partner_name = role_name(partner_role_of(role))
+
+            print(f'Client waiting for: subject={subject}, looking for={partner_name}, position={position}')
+            self.send_status(client_socket, 'waiting', f'Waiting for a {partner_name} in {subject}...', position=position)
+
+
+    def send_queue_positions(self, subject, role):
+        for position, ticket in enumerate(self.matchmaker.head(subject, role), 1):
+            self.send_status(ticket.client, 'queue', f'Position {position} in queue', position=position)
+
+
     def find_partner(self, client_socket):
-        for pair in self.active_pairs:
-            if pair[0] == client_socket:
-                return pair[1]
-            elif pair[1] == client_socket:
-                return pair[0]
+        session = self.sessions.get(client_socket)
+        if session:
+            return session.partner_of(client_socket)
         return None
 
 
     def disconnect_client(self, client_socket):
+        self.duels.leave(client_socket)
+
         with self.lock:
-            if client_socket in self.client_info:
-                info = self.client_info[client_socket]
-                wait_key = (info['subject'], info['role'])
+            ticket = self.matchmaker.forget(client_socket)
+            self.client_info.pop(client_socket, None)
 
-                if wait_key in self.waiting_clients and client_socket in self.waiting_clients[wait_key]:
-                    self.waiting_clients[wait_key].remove(client_socket)
-                    if len(self.waiting_clients[wait_key]) == 0:
-                        del self.waiting_clients[wait_key]
+            if ticket:
+                self.send_queue_positions(ticket.subject, ticket.role)
 
-                del self.client_info[client_socket]
+            session = self.sessions.pop(client_socket, None)
 
-            partner = self.find_partner(client_socket)
+            if session:
+                partner = session.partner_of(client_socket)
+                self.sessions.pop(partner, None)
 
-            if partner:
                 try:
                     self.send_status(partner, 'disconnected', 'Partner disconnected')
                 except:
                     pass
 
-                self.active_pairs = [pair for pair in self.active_pairs if client_socket not in pair]
+                info = self.client_info.get(partner)
+                if info:
+                    self.match_or_enqueue(partner, info['subject'], info['role'], info.get('since'))
 
 
     def send_message(self, client_socket, message_dict):
         try:
-            message = json.dumps(message_dict)
-            client_socket.send(message.encode('utf-8'))
+            client_socket.send_control(encode_message(message_dict))
         except Exception as e:
             print(f'Error sending message: {e}')
 
 
-    def send_status(self, client_socket, status_code, message):
+    def send_status(self, client_socket, status_code, message, **extra):
         status_message = {
             'type': MessageType.STATUS.value,
             'status': status_code,
-            'message': message
+            'message': message,
+            **extra
         }
         self.send_message(client_socket, status_message)
 
@@ -259,5 +384,98 @@ class ChatServer:
         self.send_message(client_socket, chat_message)
 
 
-server = ChatServer()
-server.start()
+class AsyncClientProtocol(asyncio.BufferedProtocol):
+
+    def __init__(self, server):
+        self.server = server
+        self.connection = None
+        self.address = None
+        self.decoder = FrameDecoder()
+
+
+    def connection_made(self, transport):
+        sock = transport.get_extra_info('socket')
+        if sock is not None:
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+        self.connection = AsyncConnection(transport, self.server.slow_consumer_policy, OUTBOUND_HIGH_WATERMARK, OUTBOUND_LOW_WATERMARK)
+        self.address = transport.get_extra_info('peername')
+
+        print(f'New connection from {self.address}')
+
+
+    def get_buffer(self, size_hint):
+        return self.decoder.get_buffer(size_hint)
+
+
+    def buffer_updated(self, nbytes):
+        self.decoder.buffer_updated(nbytes)
+
+        if not self.server.handle_frames(self.connection, self.address, self.decoder):
+            self.connection.close()
+
+
+    def pause_writing(self):
+        self.connection.pause_writing()
+
+
+    def resume_writing(self):
+        self.connection.resume_writing()
+
+
+    def connection_lost(self, exc):
+        self.connection.close()
+        self.server.disconnect_client(self.connection)
+
+        print(f'Client {self.address} disconnected')
+
+
+class AsyncChatServer(ChatServer):
+
+    def start(self):
+        asyncio.run(self.serve())
+
+
+    async def serve(self):
+        self.server_socket.bind((self.host, self.port))
+        self.server_socket.listen(socket.SOMAXCONN)
+        self.server_socket.setblocking(False)
+
+        loop = asyncio.get_running_loop()
+        self.loop = loop
+        self.loop_thread = threading.current_thread()
+        server = await loop.create_server(lambda: AsyncClientProtocol(self), sock=self.server_socket)
+        self.timers.start()
+
+        print(f'Server started on {self.host}:{self.port} (asyncio)')
+        print('Waiting for clients to connect...')
+
+        async with server:
+            await server.serve_forever()
+
+
+ENGINES = {
+    'threaded': ChatServer,
+    'asyncio': AsyncChatServer
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='TutorMe chat server')
+    parser.add_argument('--engine', choices=ENGINES.keys(), default=SERVER_ENGINE)
+    parser.add_argument('--host', default=SERVER_HOST)
+    parser.add_argument('--port', type=int, default=SERVER_PORT)
+    parser.add_argument('--match-policy', choices=POLICIES.keys(), default=MATCH_POLICY)
+    parser.add_argument('--slow-consumer-policy', choices=SLOW_CONSUMER_POLICIES, default=SLOW_CONSUMER_POLICY)
+    parser.add_argument('--ai-gateway', action=argparse.BooleanOptionalAction, default=AI_GATEWAY)
+    args = parser.parse_args()
+
+    server = ENGINES[args.engine](args.host, args.port, args.match_policy, args.slow_consumer_policy, args.ai_gateway)
+    telemetry.start_reporter(TELEMETRY_INTERVAL)
+    if server.gateway:
+        print('AI gateway enabled')
+    server.start()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,118 @@
+import atexit
+import os
+import re
+import shutil
+import tempfile
+import threading
+from collections import OrderedDict
+
+
+HANDLE_PATTERN = re.compile(r'[0-9a-f]{16}')
+
+
+class SpoolError(Exception):
+    pass
+
+
+class FileSpool:
+
+    def __init__(self, parent=None, max_bytes=512 * 1024 * 1024):
+        self.directory = tempfile.mkdtemp(prefix='tutorme-spool-', dir=parent)
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.total_bytes = 0
+        self.lock = threading.Lock()
+
+        atexit.register(self.close)
+
+
+    def close(self):
+        with self.lock:
+            self.entries.clear()
+            self.total_bytes = 0
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+
+    def contains(self, path):
+        root = os.path.realpath(self.directory)
+        path = os.path.realpath(path)
+        return path != root and os.path.commonpath([root, path]) == root
+
+
+    def add(self, handle, source_path, filename):
+        if not isinstance(handle, str) or not HANDLE_PATTERN.fullmatch(handle):
+            raise SpoolError(f'Invalid spool handle: {handle!r}')
+
+        entry_dir = os.path.join(self.directory, handle)
+        path = os.path.join(entry_dir, os.path.basename(filename) or 'download')
+        if not self.contains(path):
+            raise SpoolError(f'Refusing to spool outside {self.directory}: {path}')
+
+        os.makedirs(entry_dir, exist_ok=True)
+        os.replace(source_path, path)
+        size = os.path.getsize(path)
+
+        with self.lock:
+            previous = self.entries.pop(handle, None)
+            if previous:
+                self.total_bytes -= previous[1]
+                if previous[0] != path and os.path.exists(previous[0]):
+                    os.remove(previous[0])
+
+            self.entries[handle] = (path, size)
+            self.total_bytes += size
+            self.evict(keep=handle)
+
+        return handle
+
+
+    def path(self, handle):
+        with self.lock:
+            entry = self.entries.get(handle)
+            if entry is None:
+                return None
+
+            self.entries.move_to_end(handle)
+            return entry[0]
+
+
+    def save(self, handle, destination):
+        path = self.path(handle)
+        if path is None or not os.path.exists(path):
+            raise SpoolError('File is no longer available')
+
+        shutil.copyfile(path, destination)
+        return destination
+
+
+    def save_async(self, handle, destination, callback):
+        def run():
+            try:
+                callback(self.save(handle, destination), '')
+            except Exception as e:
+                callback(destination, str(e))
+
+        thread = threading.Thread(target=run, daemon=True)
+        thread.start()
+
+
+    def evict(self, keep=None):
+        while self.total_bytes > self.max_bytes and self.entries:
+            handle = next(iter(self.entries))
+            if handle == keep:
+                if len(self.entries) == 1:
+                    break
+                self.entries.move_to_end(handle)
+                continue
+
+            path, size = self.entries.pop(handle)
+            self.total_bytes -= size
+            self.remove_files(path)
+
+
+    def remove_files(self, path):
+        entry_dir = os.path.dirname(path)
+        if not self.contains(entry_dir):
+            print(f'[ERROR] Refusing to remove {entry_dir} outside the spool')
+            return
+        shutil.rmtree(entry_dir, ignore_errors=True)
@@ -0,0 +1,84 @@
+import math
+import threading
+import time
+
+
+class Timer:
+
+    def __init__(self, tick, callback, args):
+        self.tick = tick
+        self.callback = callback
+        self.args = args
+        self.cancelled = False
+
+
+class TimerWheel:
+
+    def __init__(self, tick=0.1, slots=512):
+        self.tick = tick
+        self.slots = [set() for _ in range(max(1, slots))]
+        self.current = 0
+        self.pending = 0
+        self.started = time.monotonic()
+        self.lock = threading.Lock()
+        self.thread = None
+
+
+    def schedule(self, delay, callback, *args):
+        with self.lock:
+            timer = Timer(self.current + max(1, math.ceil(delay / self.tick)), callback, args)
+            self.slots[timer.tick % len(self.slots)].add(timer)
+            self.pending += 1
+            return timer
+
+
+    def cancel(self, timer):
+        if timer is None:
+            return
+
+        with self.lock:
+            if timer.cancelled:
+                return
+            timer.cancelled = True
+            slot = self.slots[timer.tick % len(self.slots)]
+            if timer in slot:
+                slot.discard(timer)
+                self.pending -= 1
+
+
+    def advance(self):
+        with self.lock:
+            self.current += 1
+            slot = self.slots[self.current % len(self.slots)]
+            due = [timer for timer in slot if timer.tick <= self.current]
+            for timer in due:
+                slot.discard(timer)
+                timer.cancelled = True
+            self.pending -= len(due)
+
+        for timer in due:
+            try:
+                timer.callback(*timer.args)
+            except Exception as e:
+                print(f'[ERROR] Timer callback failed: {e}')
+
+
+    def advance_to(self, now):
+        target = int((now - self.started) / self.tick)
+        while self.current < target:
+            self.advance()
+
+
+    def run(self):
+        while True:
+            time.sleep(max(0, self.started + (self.current + 1) * self.tick - time.monotonic()))
+            self.advance_to(time.monotonic())
+
+
+    def start(self):
+        if self.thread:
+            return
+
+        self.started = time.monotonic() - self.current * self.tick
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()